@@ -1,25 +1,247 @@
 # client_utils.py
 
 import socket
-import json
+import threading
+
+from protocol import (
+    PROTOCOL_TEXT, PROTOCOL_FRAMED, TEXT_TERMINATOR, FRAME_OK, FRAME_MORE, FRAME_ERROR,
+    SocketReader, encode_frame, send_frame,
+)
 
 HOST = 'localhost'
 PORT = 65432
+POOL_SIZE = 4
+
+
+def is_protocol_command(command):
+    tokens = command.split()
+    return bool(tokens) and tokens[0].upper() == "PROTOCOL"
+
+
+class Connection:
+    def __init__(self, host=None, port=None, protocol=PROTOCOL_FRAMED):
+        self.sock = socket.create_connection((host or HOST, port or PORT))
+        self.reader = SocketReader(self.sock)
+        self.protocol = PROTOCOL_TEXT
+        self.current_db = None
+        self.execution_mode = None
+        # nev -> az eredeti PREPARE parancs, ezt adjuk ki ujra egy masik kapcsolaton
+        self.prepared_statements = {}
+        if protocol == PROTOCOL_FRAMED:
+            self.negotiate(PROTOCOL_FRAMED)
+
+    # regi szerver eseten szoveges modban maradunk
+    def negotiate(self, protocol):
+        self.send(f"PROTOCOL {protocol}")
+        response = self.receive()
+        if response == f"Protocol: {protocol}":
+            self.protocol = protocol
+        return self.protocol
+
+    def send(self, command):
+        if self.protocol == PROTOCOL_FRAMED:
+            send_frame(self.sock, FRAME_OK, command.encode())
+        else:
+            self.sock.sendall((command + "\n").encode())
+
+    def receive(self):
+        if self.protocol == PROTOCOL_TEXT:
+            data = self.reader.read_until(TEXT_TERMINATOR)
+            if data is None:
+                raise ConnectionError("Server disconnected unexpectedly.")
+            return data.decode().strip()
+
+        parts = []
+        while True:
+            frame = self.reader.read_frame()
+            if frame is None:
+                raise ConnectionError("Server disconnected unexpectedly.")
+            status, payload = frame
+            if status == FRAME_MORE:
+                parts.append(payload)
+                continue
+            if status == FRAME_ERROR:
+                # a felig elkuldott eredmenyt eldobjuk
+                return payload.decode().strip()
+            parts.append(payload)
+            return b"".join(parts).decode().strip()
+
+    # a szerver oldali session (USE, SET EXECUTION MODE, PREPARE) allapotat a kapcsolaton is nyilvantartjuk.
+    # A PROTOCOL valasza meg a regi modban jon, a kovetkezo parancs mar az uj modban megy
+    def track_session(self, command, response):
+        tokens = command.split()
+        if tokens and tokens[0].upper() == "PROTOCOL" and response.startswith("Protocol:"):
+            self.protocol = int(response.split(":", 1)[1])
+        elif len(tokens) >= 2 and tokens[0].upper() == "USE" and response.startswith("Using database:"):
+            self.current_db = tokens[1]
+        elif (
+            len(tokens) >= 3 and tokens[0].upper() == "DROP" and tokens[1].upper() == "DATABASE"
+            and tokens[2] == self.current_db and response.startswith("Database dropped:")
+        ):
+            self.current_db = None
+        elif tokens and tokens[0].upper() == "SET" and response.startswith("Execution mode:"):
+            self.execution_mode = response.split(":", 1)[1].strip()
+        elif len(tokens) >= 2 and tokens[0].upper() == "PREPARE" and response.startswith("Statement prepared:"):
+            self.prepared_statements[tokens[1]] = command
+        elif len(tokens) >= 2 and tokens[0].upper() == "DEALLOCATE" and response.startswith("Statement deallocated:"):
+            self.prepared_statements.pop(tokens[1], None)
+
+    # a kapcsolatot a pool session allapotara hozza: USE, vegrehajtasi mod es prepared statementek
+    def sync_session(self, current_db, execution_mode, prepared_statements):
+        if current_db and self.current_db != current_db:
+            self.execute(f"USE {current_db}")
+        if execution_mode and self.execution_mode != execution_mode:
+            self.execute(f"SET EXECUTION MODE {execution_mode}")
+        for name in [name for name in self.prepared_statements if name not in prepared_statements]:
+            self.execute(f"DEALLOCATE {name}")
+        for name, command in prepared_statements.items():
+            if self.prepared_statements.get(name) != command:
+                self.execute(command)
+
+    def execute(self, command):
+        self.send(command)
+        response = self.receive()
+        self.track_session(command, response)
+        return response
+
+    # az osszes parancsot elkuldjuk, csak utana olvassuk a valaszokat
+    def execute_many(self, commands):
+        # a PROTOCOL utani parancsokat mar az uj keretezessel kell elkuldeni, ezert ott kettevagjuk a pipeline-t
+        split = next((i + 1 for i, command in enumerate(commands[:-1]) if is_protocol_command(command)), None)
+        if split is not None:
+            return self.execute_many(commands[:split]) + self.execute_many(commands[split:])
+
+        payload = bytearray()
+        for command in commands:
+            if self.protocol == PROTOCOL_FRAMED:
+                payload += encode_frame(FRAME_OK, command.encode())
+            else:
+                payload += (command + "\n").encode()
+
+        # kuldes kozben mar olvasunk, kulonben nagy valaszoknal mindket oldal
+        # a sendall-ban varakozna
+        send_errors = []
+
+        def send_all():
+            try:
+                self.sock.sendall(payload)
+            except OSError as e:
+                send_errors.append(e)
+
+        sender = threading.Thread(target=send_all, daemon=True)
+        sender.start()
+        try:
+            responses = []
+            for command in commands:
+                response = self.receive()
+                self.track_session(command, response)
+                responses.append(response)
+        finally:
+            sender.join()
+        if send_errors:
+            raise send_errors[0]
+        return responses
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# kapcsolat pool: a kapcsolatok nyitva maradnak, a session allapotot (USE, SET EXECUTION MODE,
+# PREPARE) a kliens tartja nyilvan, es ha egy kapcsolat eltero allapotban van, ujra kiadja ra
+class Client:
+    def __init__(self, host=None, port=None, pool_size=POOL_SIZE, protocol=PROTOCOL_FRAMED):
+        self.host = host or HOST
+        self.port = port or PORT
+        self.pool_size = pool_size
+        self.protocol = protocol
+        self.current_db = None
+        self.execution_mode = None
+        self.prepared_statements = {}
+        self.pool = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            conn = self.pool.pop() if self.pool else None
+        if conn is None:
+            conn = Connection(self.host, self.port, self.protocol)
+        try:
+            conn.sync_session(self.current_db, self.execution_mode, self.prepared_statements)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def release(self, conn):
+        with self.lock:
+            if len(self.pool) < self.pool_size:
+                self.pool.append(conn)
+                return
+        conn.close()
+
+    # egy kapcsolatot elore megnyit, igy a hibas cim mar itt kiderul
+    def connect(self):
+        self.release(self.acquire())
+
+    # egy parancshoz nem kell a pipeline kuldo szala
+    def execute(self, command):
+        return self.run_on_connection(lambda conn: [conn.execute(command)], 1)[0]
+
+    def execute_many(self, commands):
+        if not commands:
+            return []
+        return self.run_on_connection(lambda conn: conn.execute_many(commands), len(commands))
+
+    # run(conn) a valaszok listajat adja; hiba eseten minden parancsra ugyanazt a hibat adjuk vissza
+    def run_on_connection(self, run, command_count):
+        try:
+            conn = self.acquire()
+        except ConnectionRefusedError:
+            return [f"Error: Connection to {self.host}:{self.port} refused."] * command_count
+        except OSError as e:
+            return [f"Error: {e}"] * command_count
+
+        try:
+            responses = run(conn)
+        except Exception as e:
+            # a felbehagyott kapcsolatot nem tesszuk vissza a poolba
+            conn.close()
+            return [f"Error during command sending/receiving: {e}"] * command_count
+
+        self.current_db = conn.current_db
+        self.execution_mode = conn.execution_mode
+        self.prepared_statements = dict(conn.prepared_statements)
+        self.release(conn)
+        return responses
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, []
+        for conn in pool:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 def send_command_via_existing_socket(s: socket.socket, command: str) -> str:
     try:
         s.sendall((command + "\n").encode())
 
-        buffer = ""
-        while "<<END>>" not in buffer:
-            data = s.recv(4096).decode()
-            if not data:
-                return "Error: Server disconnected unexpectedly."
-            buffer += data
-        
-        #response, _ = buffer.split("\n", 1)
-        response = buffer.replace("<<END>>", "").strip()
-        return response
+        reader = SocketReader(s)
+        data = reader.read_until(TEXT_TERMINATOR)
+        if data is None:
+            return "Error: Server disconnected unexpectedly."
+        return data.decode().strip()
     except BrokenPipeError:
         return "Error: Connection to server lost (Broken Pipe)."
     except ConnectionResetError:
@@ -29,34 +251,13 @@ def send_command_via_existing_socket(s: socket.socket, command: str) -> str:
 
 def send_batch_commands_new_socket(commands: list[str]) -> list[str]:
     responses = []
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        try:
-            s.connect((HOST, PORT))
-            
-            full_command_string = "\n".join(commands) + "\n" 
-            s.sendall(full_command_string.encode())
-            
-            recv_buffer = ""
-            expected_responses = len(commands)
-            received_response_count = 0
-
-            while received_response_count < expected_responses:
-                data = s.recv(4096).decode()
-                if not data:
-                    print(f"Warning: Server disconnected prematurely after {received_response_count}/{expected_responses} responses.")
-                    break 
-                
-                recv_buffer += data
-                
-                while "\n" in recv_buffer and received_response_count < expected_responses:
-                    response, recv_buffer = recv_buffer.split("\n", 1)
-                    responses.append(response)
-                    received_response_count += 1
-                    
-        except ConnectionRefusedError:
-            print(f"Error: Connection to {HOST}:{PORT} refused. Is the server running?")
-            responses.append("Error: Connection refused.")
-        except Exception as e:
-            print(f"Error during batch send: {e}")
-            responses.append(f"Error: {e}")
-    return responses
\ No newline at end of file
+    try:
+        with Connection() as conn:
+            responses = conn.execute_many(commands)
+    except ConnectionRefusedError:
+        print(f"Error: Connection to {HOST}:{PORT} refused. Is the server running?")
+        responses.append("Error: Connection refused.")
+    except Exception as e:
+        print(f"Error during batch send: {e}")
+        responses.append(f"Error: {e}")
+    return responses
@@ -1,25 +1,28 @@
 import random
 import string
 from time import time
-from client_utils import send_batch_commands_new_socket
+from client_utils import Client
+
+DB_NAME = "nagyABindex"
 
 
 def random_name(length=6):
     return "".join(random.choices(string.ascii_lowercase, k=length))
 
 
+# a pool nyitva tartja a kapcsolatot, a USE a sessionben megmarad
+client = Client()
+
+
 def send_single_command_wrapper(command: str) -> str:
-    responses = send_batch_commands_new_socket([command])
-    if responses:
-        return responses[0]
-    return "Error: No response received."
+    return client.execute(command)
 
 
-create_db_response = send_single_command_wrapper("CREATE DATABASE nagyABindex")
-print(f"CREATE DATABASE nagyABindex: {create_db_response}")
+create_db_response = send_single_command_wrapper(f"CREATE DATABASE {DB_NAME}")
+print(f"CREATE DATABASE {DB_NAME}: {create_db_response}")
 
-use_response = send_single_command_wrapper("USE nagyABindex")
-print(f"USE nagyABindex   : {use_response}")
+use_response = send_single_command_wrapper(f"USE {DB_NAME}")
+print(f"USE {DB_NAME}   : {use_response}")
 
 print(send_single_command_wrapper("CREATE TABLE users id:int name:str age:int salary:float"))
 print(send_single_command_wrapper("CREATE TABLE products product_id:int product_name:str price:int category_id:int brand_id:int"))
@@ -169,4 +172,5 @@ print(send_single_command_wrapper("CREATE INDEX category_id ON products"))
 print(send_single_command_wrapper("CREATE INDEX brand_id ON products"))
 
 print(send_single_command_wrapper("CREATE INDEX user_id ON orders"))
+client.close()
 print("\nGeneration complete!")
\ No newline at end of file
@@ -1,11 +1,10 @@
 import json
-import socket
 import os
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import Completer, Completion
 
 # Feltételezzük, hogy a client_utils.py létezik és tartalmazza a szükséges függvényt.
-from client_utils import send_command_via_existing_socket
+from client_utils import Client
 
 HOST = "localhost"
 PORT = 65432
@@ -51,6 +50,7 @@ class SQLCompleter(Completer):
                 if char_before_cursor.isspace():
                     suggestions.update(self.order_by_keywords)
                     suggestions.add(",")
+                    suggestions.add("LIMIT")
                 else:
                     suggestions.update(self.fields)
             elif groupby_idx > -1 and groupby_idx == last_clause_idx:
@@ -100,6 +100,8 @@ class SQLCompleter(Completer):
                     suggestions.update(self.fields)
                     suggestions.update(self.aggregates)
                     suggestions.add("*")
+                    if len(tokens) == 1:
+                        suggestions.add("DISTINCT")
 
         elif main_cmd in ("DROP", "CREATE"):
             if len(tokens) > 1:
@@ -115,6 +117,12 @@ class SQLCompleter(Completer):
                 suggestions.add("UNIQUE")
         elif main_cmd == "USE":
             suggestions.update(self.databases)
+        elif main_cmd == "EXPLAIN" and len(tokens) == 1:
+            suggestions.add("ANALYZE")
+            suggestions.add("SELECT")
+        elif main_cmd == "CACHE":
+            suggestions.add("CLEAR")
+            suggestions.add("STATS")
         else:
             suggestions.update(self.main_keywords)
 
@@ -126,7 +134,8 @@ class SQLCompleter(Completer):
 def get_completer():
     global current_db
     main_keywords = [
-        "SELECT", "INSERT", "DELETE", "UPDATE", "CREATE", "DROP", "USE",
+        "SELECT", "INSERT", "DELETE", "UPDATE", "CREATE", "DROP", "USE", "MIGRATE", "REPAIR", "ANALYZE", "SET",
+        "CACHE", "PREPARE", "EXECUTE", "DEALLOCATE", "EXPLAIN",
     ]
 
     tables = []
@@ -164,9 +173,10 @@ def main():
     global current_db
     session = PromptSession()
 
-    cli_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # egy kapcsolat eleg, a pool megorzi a sessiont
+    client = Client(HOST, PORT, pool_size=1)
     try:
-        cli_socket.connect((HOST, PORT))
+        client.connect()
         print(f"Successfully connected to server at {HOST}:{PORT}")
     except ConnectionRefusedError:
         print(
@@ -194,9 +204,7 @@ def main():
             if cmd.lower() == "exit":
                 break
 
-            response_from_server = send_command_via_existing_socket(
-                cli_socket, cmd
-            )
+            response_from_server = client.execute(cmd)
 
             if cmd.upper().startswith("USE "):
                 parts = cmd.split(" ", 1)
@@ -211,7 +219,7 @@ def main():
         print(f"An unexpected error occurred in the client: {e}")
     finally:
         print("\nClosing connection to server.")
-        cli_socket.close()
+        client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+# protocol.py
+#
+# A szerver es a kliens kozos wire protokollja.
+#
+# Szoveges mod (1-es verzio): a parancsok "\n"-nel vegzodnek, a valaszok
+# "\n<<END>>\n"-nel. Minden kapcsolat ebben a modban indul.
+#
+# Keretezett mod (2-es verzio): a kliens a "PROTOCOL 2" paranccsal kapcsol at,
+# a szerver szovegesen valaszol ("Protocol: 2"), utana mindket irany keretekben
+# megy. Egy keret: 4 bajtos hossz (big endian), 1 bajtos statusz, utana a payload.
+# A valasz lehet tobb keret is: FRAME_MORE keretek, majd egy zaro FRAME_OK vagy
+# FRAME_ERROR keret.
+
+import struct
+
+PROTOCOL_TEXT = 1
+PROTOCOL_FRAMED = 2
+
+TEXT_TERMINATOR = b"\n<<END>>\n"
+
+FRAME_OK = 0
+FRAME_MORE = 1
+FRAME_ERROR = 2
+
+FRAME_HEADER = struct.Struct(">IB")
+MAX_FRAME_SIZE = 1 << 30
+RECV_SIZE = 65536
+# ennel kisebb payloadot a fejlecel egyutt, egy sendall-lal kuldunk
+SMALL_FRAME_SIZE = 65536
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(status, payload=b""):
+    return FRAME_HEADER.pack(len(payload), status) + payload
+
+
+def send_frame(sock, status, payload=b""):
+    header = FRAME_HEADER.pack(len(payload), status)
+    if len(payload) < SMALL_FRAME_SIZE:
+        sock.sendall(header + payload)
+    else:
+        sock.sendall(header)
+        sock.sendall(payload)
+
+
+# bufferelt olvaso a sockethez, a feldolgozott resz csak ritkan masolodik
+class SocketReader:
+    def __init__(self, sock, recv_size=RECV_SIZE):
+        self.sock = sock
+        self.recv_size = recv_size
+        self.buffer = bytearray()
+        self.start = 0
+        self.scan_pos = 0
+
+    def available(self):
+        return len(self.buffer) - self.start
+
+    def _fill(self):
+        data = self.sock.recv(self.recv_size)
+        if not data:
+            return False
+        # a mar feldolgozott elejet csak akkor vagjuk le, ha az a buffer nagyobbik fele
+        if self.start and self.start * 2 >= len(self.buffer):
+            del self.buffer[:self.start]
+            self.scan_pos -= self.start
+            self.start = 0
+        self.buffer += data
+        return True
+
+    # a kovetkezo delimiterig olvas, a delimitert levagja; EOF eseten None
+    def read_until(self, delimiter):
+        while True:
+            pos = self.buffer.find(delimiter, self.scan_pos)
+            if pos != -1:
+                data = bytes(self.buffer[self.start:pos])
+                self.start = self.scan_pos = pos + len(delimiter)
+                return data
+            # a mar atnezett reszt nem keressuk at ujra
+            self.scan_pos = max(self.start, len(self.buffer) - len(delimiter) + 1)
+            if not self._fill():
+                return None
+
+    # pontosan size bajtot olvas; EOF eseten None
+    def read_exact(self, size):
+        if size <= self.recv_size:
+            while self.available() < size:
+                if not self._fill():
+                    return None
+            data = bytes(self.buffer[self.start:self.start + size])
+            self.start += size
+            self.scan_pos = max(self.scan_pos, self.start)
+            return data
+
+        # nagy payload: elore lefoglalt bufferbe olvasunk, masolas nelkul
+        result = bytearray(size)
+        view = memoryview(result)
+        received = self.available()
+        view[:received] = self.buffer[self.start:]
+        self.buffer = bytearray()
+        self.start = self.scan_pos = 0
+        while received < size:
+            n = self.sock.recv_into(view[received:], size - received)
+            if n == 0:
+                return None
+            received += n
+        return result
+
+    # egy keretet olvas, (statusz, payload) part ad vissza; EOF eseten None
+    def read_frame(self):
+        header = self.read_exact(FRAME_HEADER.size)
+        if header is None:
+            return None
+        size, status = FRAME_HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Frame too large: {size} bytes.")
+        payload = self.read_exact(size)
+        if payload is None:
+            return None
+        return status, payload
@@ -4,121 +4,590 @@ import os
 from pymongo import MongoClient
 import re
 import pymongo
-import functools
+import itertools
+import tempfile
+import threading
+import bisect
+import heapq
+import math
+import operator
+import pickle
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from protocol import (
+    PROTOCOL_TEXT, PROTOCOL_FRAMED, FRAME_OK, FRAME_MORE, FRAME_ERROR,
+    SocketReader, send_frame,
+)
 
 HOST = 'localhost'
 PORT = 65432
 CATALOG_FILE = 'catalog.json'
-
-mongo_client = MongoClient("mongodb://localhost:27017/")
-mongo_db = None
-current_db = None
+# uj tablak tipusos mezokben taroljak a sorokat a "#"-es value string helyett
+STORAGE_FIELDS = "fields"
+# uj tablak _id-ja a nativ int/float kulcs, igy a MongoDB _id indexe helyesen rendez
+KEY_ENCODING_NATIVE = "native"
+MIGRATE_BATCH_SIZE = 1000
+CONSTRAINT_CHECK_BATCH_SIZE = 5000
+KEY_INDEX_NAME = "key_1"
+INDEX_ID_BATCH_SIZE = 1000
+# ennyi sor kerul egy elkuldott darabba a SELECT eredmenyebol
+RESULT_BATCH_SIZE = 500
+# tartomany feltetelnel ennel nagyobb aranyu talalat eseten olcsobb a teljes scan
+INDEX_RANGE_MAX_FRACTION = 0.3
+# ANALYZE: ennyi egyenlo gyakorisagu savra bontjuk az oszlop ertekeit
+HISTOGRAM_BUCKETS = 20
+# becsult szelektivitas, ha nincs statisztika
+DEFAULT_EQ_SELECTIVITY = 0.1
+DEFAULT_RANGE_SELECTIVITY = 0.3
+# koltsegmodell egysegei: egy sor szekvencialis olvasasa = 1
+COST_SEQ_ROW = 1.0
+COST_RANDOM_ROW = 4.0
+COST_ROUND_TRIP = 50.0
+COST_HASH_BUILD_ROW = 1.0
+COST_HASH_PROBE_ROW = 0.2
+COST_SORT_COMPARE = 0.1
+COST_MERGE_ROW = 0.1
+COST_SPILL_ROW = 2.0
+# a memoria becslesehez hasznalt atlagos sormeret (bajt), amig nincs mert adat
+ESTIMATED_ROW_BYTES = 500
+JOIN_BATCH_SIZE = 1000
+# a hash join hash tablaja eddig a becsult meretig (bajt) marad memoriaban, felette
+# a ket oldalt particiokra bontva ideiglenes fajlokba irjuk (grace hash join)
+HASH_JOIN_MEMORY_BUDGET = 64 * 1024 * 1024
+HASH_JOIN_PARTITIONS = 16
+# ennyiszer particionalunk ujra, ha egy particio meg mindig nem fer el
+HASH_JOIN_MAX_DEPTH = 3
+# kulso rendezes: eddig rendezunk memoriaban, felette rendezett futamokat irunk ki
+SORT_MEMORY_BUDGET = 64 * 1024 * 1024
+# egy osszefesulesben legfeljebb ennyi rendezett futamot nyitunk meg egyszerre
+MERGE_FAN_IN = 64
+# SELECT DISTINCT: eddig tartjuk memoriaban a mar latott sorokat, felette az uj sorok
+# ennyi particioba kerulnek ki lemezre
+DISTINCT_MEMORY_BUDGET = 64 * 1024 * 1024
+DISTINCT_PARTITIONS = 16
+# a sormeretet ennyi sor atlagabol becsuljuk
+ROW_SIZE_SAMPLE = 100
+# ennyi tablaig dinamikus programozassal keressuk a join sorrendet, felette moho modon
+JOIN_DP_MAX_RELATIONS = 6
+# oszlopos (NumPy) vegrehajtas aggregalo lekerdezesekhez: ennyi soronkent dekodolunk oszlopokra
+COLUMNAR_BATCH_SIZE = 8192
+# AUTO modban ennyi sortol valasztjuk az oszlopos vegrehajtast
+COLUMNAR_MIN_ROWS = 10000
+EXECUTION_MODE_ROW = "ROW"
+EXECUTION_MODE_COLUMNAR = "COLUMNAR"
+EXECUTION_MODE_AUTO = "AUTO"
+EXECUTION_MODES = (EXECUTION_MODE_ROW, EXECUTION_MODE_COLUMNAR, EXECUTION_MODE_AUTO)
+
+# SELECT eredmeny cache: teljes meret, egy bejegyzes maximalis merete es lejarati ido
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+RESULT_CACHE_TTL = 60
+# ennyi leforditott SELECT tervet tartunk meg (PREPARE / EXECUTE)
+PLAN_CACHE_SIZE = 256
+PARAMETER_PLACEHOLDER = "?"
+
+class RoundTripCounter(pymongo.monitoring.CommandListener):
+    # EXPLAIN ANALYZE: a szal aktiv profiljahoz szamolja a MongoDB-nek kuldott parancsokat
+    def __init__(self):
+        self.local = threading.local()
+
+    def started(self, event):
+        profile = getattr(self.local, "profile", None)
+        if profile is not None:
+            profile.count_round_trip()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+round_trip_counter = RoundTripCounter()
+mongo_client = MongoClient("mongodb://localhost:27017/", event_listeners=[round_trip_counter])
 
 aggregate_pattern = re.compile(r'(MIN|MAX|AVG|COUNT|SUM)\(([\w*.]+)\)', re.IGNORECASE)
+condition_pattern = re.compile(r'([\w.]+)\s*(=|<=|>=|<|>)\s*(.+)')
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.mtime = None
+        self.version = 0
+        self.databases = {}
+        self.tables = {}
+        # DDL modositasok es az ujratoltes ezt a lockot fogjak
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        # csak akkor olvassuk ujra, ha a fajl megvaltozott
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if self.data is not None and mtime == self.mtime:
+            return
+
+        with self.lock:
+            if self.data is not None and mtime == self.mtime:
+                return
+            if mtime is None:
+                data = {"databases": []}
+            else:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            self._install(data, mtime)
+
+    def _install(self, data, mtime):
+        self.data = data
+        self.mtime = mtime
+        self.databases = {db["name"]: db for db in data["databases"]}
+        self.tables = {
+            db["name"]: {t["name"]: t for t in db["tables"]}
+            for db in data["databases"]
+        }
+        self.version += 1
+
+    def save(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".catalog-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._install(self.data, os.stat(self.path).st_mtime_ns)
+
+    def get_database(self, db_name):
+        return self.databases.get(db_name)
+
+    def get_table(self, db_name, table_name):
+        return self.tables.get(db_name, {}).get(table_name)
 
 
+catalog = Catalog(CATALOG_FILE)
 if not os.path.exists(CATALOG_FILE):
-    with open(CATALOG_FILE, "w") as f:
-        json.dump({"databases": []}, f, indent=4)
+    catalog.refresh()
+    catalog.save()
+
+
+class IndexRegistry:
+    # adatbazisonkent nyilvantartja, mely _index/_uniqindex kollekciok leteznek
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index_collections = {}
+        # minden index letrehozas/torles noveli, a cache-elt tervek ehhez igazodnak
+        self.version = 0
+
+    def _load(self, mongo_db):
+        names = self.index_collections.get(mongo_db.name)
+        if names is None:
+            names = {
+                coll_name for coll_name in mongo_db.list_collection_names()
+                if coll_name.endswith("_index") or coll_name.endswith("_uniqindex")
+            }
+            self.index_collections[mongo_db.name] = names
+        return names
+
+    def exists(self, mongo_db, index_collection_name):
+        names = self.index_collections.get(mongo_db.name)
+        if names is None:
+            with self.lock:
+                names = self._load(mongo_db)
+        return index_collection_name in names
+
+    def add(self, mongo_db, index_collection_name):
+        with self.lock:
+            self._load(mongo_db).add(index_collection_name)
+            self.version += 1
+
+    def discard(self, mongo_db, index_collection_name):
+        with self.lock:
+            self._load(mongo_db).discard(index_collection_name)
+            self.version += 1
+
+    def collection_names(self, mongo_db):
+        with self.lock:
+            return sorted(self._load(mongo_db))
+
+    def forget_database(self, db_name):
+        with self.lock:
+            self.index_collections.pop(db_name, None)
+            self.version += 1
+
+
+index_registry = IndexRegistry()
+
+
+class ResultCache:
+    # a SELECT-ek kesz valaszai (db, lekerdezes szoveg) kulccsal, LRU sorrendben;
+    # tablankenti verzioszam jelzi, ha egy iras vagy DDL elavulta tette oket
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, max_entry_bytes=RESULT_CACHE_MAX_ENTRY_BYTES, ttl=RESULT_CACHE_TTL):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.keys_by_table = {}
+        self.versions = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["chunks"]
+
+    # a (db, None) kulcs az egesz adatbazis verzioja (DROP DATABASE)
+    def table_versions(self, db_name, table_names):
+        with self.lock:
+            return {
+                (db_name, table_name): self.versions.get((db_name, table_name), 0)
+                for table_name in [None, *table_names]
+            }
+
+    # tovabbadja a darabokat, es ha a valasz vegig elkeszult, elteszi
+    def collect(self, key, versions, chunks):
+        collected, size = [], 0
+        for chunk in chunks:
+            if collected is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    collected = None
+                else:
+                    collected.append(chunk)
+            yield chunk
+        if collected is not None:
+            self.put(key, versions, tuple(collected), size)
+
+    def put(self, key, versions, chunks, size):
+        with self.lock:
+            # ha futas kozben irtak valamelyik tablaba, az eredmeny mar nem biztos, hogy friss
+            if any(self.versions.get(table_key, 0) != version for table_key, version in versions.items()):
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {
+                "chunks": chunks, "size": size,
+                "expires": time.monotonic() + self.ttl, "tables": list(versions),
+            }
+            for table_key in versions:
+                self.keys_by_table.setdefault(table_key, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry["size"]
+        for table_key in entry["tables"]:
+            keys = self.keys_by_table.get(table_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_table[table_key]
+
+    def invalidate(self, db_name, table_name=None):
+        table_key = (db_name, table_name)
+        with self.lock:
+            self.versions[table_key] = self.versions.get(table_key, 0) + 1
+            for key in list(self.keys_by_table.get(table_key, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_table.clear()
+            self.size = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "entries": len(self.entries), "bytes": self.size,
+            }
 
 
-def load_catalog():
-    with open(CATALOG_FILE, "r") as f:
-        return json.load(f)
+result_cache = ResultCache()
+
+
+class PlanCache:
+    # a SELECT tervek (db, lekerdezes, parameter tipusok) kulccsal, LRU sorrendben;
+    # a terv csak ugyanazon katalogus es index verzio mellett hasznalhato ujra
+    def __init__(self, max_entries=PLAN_CACHE_SIZE):
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.plans = OrderedDict()
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.plans.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self.plans.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, plan):
+        with self.lock:
+            self.plans[key] = (version, plan)
+            self.plans.move_to_end(key)
+            while len(self.plans) > self.max_entries:
+                self.plans.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.plans.clear()
+
+
+plan_cache = PlanCache()
+
+
+# DDL, ANALYZE (katalogus) vagy CREATE INDEX utan a regi tervek mar nem ervenyesek
+def plan_cache_version():
+    return catalog.version, index_registry.version
+
+
+class QueryProfile:
+    # EXPLAIN ANALYZE: operatoronkent ido, kimeno sorok, MongoDB round tripek es memoria csucs;
+    # a pipeline huzott, ezert minden ertek a gyerek operatorokat is tartalmazza
+    def __init__(self):
+        self.stats = {}
+        self.active = []
+        self.round_trips = 0
+        self.peak_memory = 0
+        self.base_memory = tracemalloc.get_traced_memory()[0]
+
+    def stats_for(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = {"time": 0.0, "rows": 0, "round_trips": 0, "peak_memory": 0}
+        return stats
+
+    def _update_peak(self):
+        # a legutobbi valtas ota mert csucs az akkor aktiv operatorokhoz tartozik
+        peak = tracemalloc.get_traced_memory()[1] - self.base_memory
+        self.peak_memory = max(self.peak_memory, peak)
+        for stats in self.active:
+            stats["peak_memory"] = max(stats["peak_memory"], peak)
+        tracemalloc.reset_peak()
+
+    def enter(self, key):
+        self._update_peak()
+        stats = self.stats_for(key)
+        self.active.append(stats)
+        return stats, time.perf_counter()
+
+    def exit(self, stats, started):
+        stats["time"] += time.perf_counter() - started
+        self._update_peak()
+        self.active.pop()
+
+    def count_round_trip(self):
+        self.round_trips += 1
+        for stats in self.active:
+            stats["round_trips"] += 1
+
+    def call(self, key, func, *args, **kwargs):
+        stats, started = self.enter(key)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.exit(stats, started)
+
+    def track(self, key, rows):
+        rows = iter(rows)
+        while True:
+            stats, started = self.enter(key)
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                self.exit(stats, started)
+            stats["rows"] += 1
+            yield row
+
+
+def trace_call(profile, key, func, *args, **kwargs):
+    if profile is None:
+        return func(*args, **kwargs)
+    return profile.call(key, func, *args, **kwargs)
+
+
+def trace_rows(profile, key, rows):
+    if profile is None:
+        return rows
+    return profile.track(key, rows)
 
 
-def save_catalog(data):
-    with open(CATALOG_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+class Session:
+    def __init__(self, addr=None):
+        self.addr = addr
+        self.current_db = None
+        self.mongo_db = None
+        self.protocol = PROTOCOL_TEXT
+        self.execution_mode = EXECUTION_MODE_AUTO
+        self.prepared_statements = {}
 
+    def use(self, db_name):
+        self.current_db = db_name
+        self.mongo_db = mongo_client[db_name]
 
-def get_current_database(catalog):
-    global current_db
-    if not current_db:
+    def reset(self):
+        self.current_db = None
+        self.mongo_db = None
+
+
+def get_current_database(session):
+    if not session.current_db:
         return None
-    for db in catalog["databases"]:
-        if db["name"] == current_db:
-            return db
-    return None
+    return catalog.get_database(session.current_db)
 
 
-def process_command(command):
-    global current_db
+def process_command(command, session):
     tokens = command.strip().split()
     if not tokens:
         return "Error: no command"
 
     cmd = tokens[0].upper()
+    catalog.refresh()
 
     if cmd == "USE":
         if len(tokens) < 2:
             return "Error: no Database name given"
         db_name = tokens[1]
-        catalog = load_catalog()
-        for db in catalog["databases"]:
-            if db["name"] == db_name:
-                global current_db, mongo_db
-                current_db = db_name
-                mongo_db = mongo_client[db_name]
-                return f"Using database: {db_name}"
+        if catalog.get_database(db_name) is not None:
+            session.use(db_name)
+            return f"Using database: {db_name}"
         return "Error: This database doesn't exist"
 
+    elif cmd == "PROTOCOL":
+        # a valasz meg a regi modban megy ki, utana valt a kapcsolat
+        if len(tokens) < 2 or tokens[1] not in (str(PROTOCOL_TEXT), str(PROTOCOL_FRAMED)):
+            return f"Error: Unsupported protocol. Usage: PROTOCOL {PROTOCOL_TEXT}|{PROTOCOL_FRAMED}"
+        session.protocol = int(tokens[1])
+        return f"Protocol: {session.protocol}"
+    elif cmd == "SET":
+        if len(tokens) != 4 or tokens[1].upper() != "EXECUTION" or tokens[2].upper() != "MODE" \
+                or tokens[3].upper() not in EXECUTION_MODES:
+            return f"Syntax error in SET. Usage: SET EXECUTION MODE {'|'.join(EXECUTION_MODES)}"
+        if tokens[3].upper() == EXECUTION_MODE_COLUMNAR and np is None:
+            return "Error: Columnar execution requires NumPy."
+        session.execution_mode = tokens[3].upper()
+        return f"Execution mode: {session.execution_mode}"
+    elif cmd == "CACHE":
+        if len(tokens) != 2 or tokens[1].upper() not in ("CLEAR", "STATS"):
+            return "Syntax error in CACHE. Usage: CACHE CLEAR|STATS"
+        if tokens[1].upper() == "CLEAR":
+            result_cache.clear()
+            return "Result cache cleared."
+        stats = result_cache.stats()
+        return f"Result cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries, {stats['bytes']} bytes"
     elif cmd == "CREATE" and tokens[1].upper() == "DATABASE":
         return create_database(tokens[2])
     elif cmd == "DROP" and tokens[1].upper() == "DATABASE":
-        return drop_database(tokens[2])
+        return drop_database(tokens[2], session)
     elif cmd == "CREATE" and tokens[1].upper() == "TABLE":
-        return create_table(tokens[2], tokens[3:])
+        return create_table(tokens[2], tokens[3:], session)
     elif cmd == "DROP" and tokens[1].upper() == "TABLE":
-        return drop_table(tokens[2])
+        return drop_table(tokens[2], session)
     elif cmd == "INSERT":
         if len(tokens) > 1 and tokens[1].upper() == "BULK":
-            return insert_bulk_into_table(tokens)
+            return insert_bulk_into_table(tokens, session)
         else:
-            return insert_into_table(tokens)
+            return insert_into_table(tokens, session)
     elif cmd == "DELETE":
-        return delete_from_table(tokens)
+        return delete_from_table(tokens, session)
     elif cmd == "CREATE" and tokens[1].upper() == "INDEX" or tokens[1].upper() == "UNIQUE":
-        return create_index(tokens)
+        return create_index(tokens, session)
+    elif cmd == "MIGRATE":
+        if len(tokens) < 3 or tokens[1].upper() != "TABLE":
+            return "Syntax error in MIGRATE. Usage: MIGRATE TABLE <table_name>"
+        return migrate_table(tokens[2], session)
+    elif cmd == "ANALYZE":
+        if len(tokens) < 2:
+            return "Syntax error in ANALYZE. Usage: ANALYZE <table_name>"
+        return analyze_table(tokens[1], session)
+    elif cmd == "REPAIR":
+        if len(tokens) < 2 or tokens[1].upper() != "INDEXES":
+            return "Syntax error in REPAIR. Usage: REPAIR INDEXES"
+        return repair_indexes(session)
     elif cmd == "SELECT":
         print("SELECT")
-        return select_from_table(tokens)
+        return select_from_table(tokens, session)
+    elif cmd == "EXPLAIN":
+        return explain_select(tokens, session)
+    elif cmd == "PREPARE":
+        return prepare_statement(tokens, session)
+    elif cmd == "EXECUTE":
+        return execute_prepared_statement(tokens, session)
+    elif cmd == "DEALLOCATE":
+        if len(tokens) != 2:
+            return "Syntax error in DEALLOCATE. Usage: DEALLOCATE <name>"
+        if session.prepared_statements.pop(tokens[1], None) is None:
+            return f"Error: Prepared statement '{tokens[1]}' does not exist."
+        return f"Statement deallocated: {tokens[1]}"
     else:
         return "Unknown command"
 
 
 def create_database(name):
-    catalog = load_catalog()
-    if any(db["name"] == name for db in catalog["databases"]):
-        return "This database already exists."
-    catalog["databases"].append({"name": name, "tables": []})
-    save_catalog(catalog)
+    with catalog.lock:
+        if catalog.get_database(name) is not None:
+            return "This database already exists."
+        catalog.data["databases"].append({"name": name, "tables": []})
+        catalog.save()
     return f"Database Created: {name}"
 
 
-def drop_database(name):
-    global current_db
-    catalog = load_catalog()
-    new_dbs = [db for db in catalog["databases"] if db["name"] != name]
-    if len(new_dbs) == len(catalog["databases"]):
-        return "This database doesn't exist."
-    catalog["databases"] = new_dbs
-    if current_db == name:
-        current_db = None 
-    save_catalog(catalog)
+def drop_database(name, session):
+    with catalog.lock:
+        if catalog.get_database(name) is None:
+            return "This database doesn't exist."
+        catalog.data["databases"] = [db for db in catalog.data["databases"] if db["name"] != name]
+        catalog.save()
+    if session.current_db == name:
+        session.reset()
+    index_registry.forget_database(name)
     mongo_client.drop_database(name)
+    result_cache.invalidate(name)
     return f"Database dropped: {name}"
 
 
-def create_table(name, attributes_raw):
-    catalog = load_catalog()
-    db = get_current_database(catalog)
+def create_table(name, attributes_raw, session):
+    mongo_db = session.mongo_db
+    db = get_current_database(session)
     if not db:
         return "Error: There is no selected database. Usage: USE <db_name> command."
 
-    if any(t["name"] == name for t in db["tables"]):
-        return "This table already exists."
-
     attributes = []
     for attr in attributes_raw:
         if ":" not in attr:
@@ -126,70 +595,335 @@ def create_table(name, attributes_raw):
         attr_name, attr_type = attr.split(":")
         attributes.append({"name": attr_name, "type": attr_type})
 
-    db["tables"].append({"name": name, "attributes": attributes})
-    save_catalog(catalog)
+    with catalog.lock:
+        db = catalog.get_database(db["name"])
+        if catalog.get_table(db["name"], name) is not None:
+            return "This table already exists."
+        db["tables"].append({
+            "name": name,
+            "attributes": attributes,
+            "storage": STORAGE_FIELDS,
+            "key_encoding": KEY_ENCODING_NATIVE,
+        })
+        catalog.save()
 
     if mongo_db is not None:
         mongo_db.create_collection(name)
+    result_cache.invalidate(db["name"], name)
 
     return f"Table created: {name}"
 
 
-def drop_table(name):
-    catalog = load_catalog()
-    db = get_current_database(catalog)
+def drop_table(name, session):
+    mongo_db = session.mongo_db
+    db = get_current_database(session)
     if not db:
         return "Error: There is no selected database. Usage: USE <db_name> command."
 
-    new_tables = [t for t in db["tables"] if t["name"] != name]
-    if len(new_tables) == len(db["tables"]):
-        return "Table could not be found."
-
-    db["tables"] = new_tables
-    save_catalog(catalog)
+    with catalog.lock:
+        db = catalog.get_database(db["name"])
+        table_info = catalog.get_table(db["name"], name)
+        if table_info is None:
+            return "Table could not be found."
+        db["tables"] = [t for t in db["tables"] if t["name"] != name]
+        catalog.save()
 
     if mongo_db is not None:
         mongo_db[name].drop()
 
-        collections_to_drop = []
-        for coll_name in mongo_db.list_collection_names():
-            if coll_name.startswith(f"{name}_") and (coll_name.endswith("_index") or coll_name.endswith("_uniqindex")):
-                collections_to_drop.append(coll_name)
-
-        for coll_to_drop in collections_to_drop:
-            mongo_db[coll_to_drop].drop()
+        for attr in table_info["attributes"]:
+            for suffix in ("index", "uniqindex"):
+                coll_to_drop = f"{name}_{attr['name']}_{suffix}"
+                if index_registry.exists(mongo_db, coll_to_drop):
+                    mongo_db[coll_to_drop].drop()
+                    index_registry.discard(mongo_db, coll_to_drop)
+    result_cache.invalidate(db["name"], name)
 
     return f"Table dropped: {name}"
 
-def parse_value_string_to_dict(value_str, table_attributes):
-    parsed_obj = {}
-    if not value_str: # Kezeljuk az ures stringet
-        return parsed_obj
-    
-    parts = value_str.split("#")
-    
-    for i, attr in enumerate(table_attributes):
-        if i == 0: 
-            continue
-        
-        if (i - 1) < len(parts): 
-            val_str = parts[i-1]
-            try:
-                if attr["type"] == "int":
-                    parsed_obj[attr["name"]] = int(val_str)
-                elif attr["type"] == "float":
-                    parsed_obj[attr["name"]] = float(val_str)
-                elif attr["type"] == "str":
-                    parsed_obj[attr["name"]] = val_str
-                else: 
-                    parsed_obj[attr["name"]] = val_str
-            except ValueError:
-                parsed_obj[attr["name"]] = None 
+def uses_field_storage(table_info):
+    return table_info.get("storage") == STORAGE_FIELDS
+
+def uses_native_keys(table_info):
+    return table_info.get("key_encoding") == KEY_ENCODING_NATIVE
+
+def encode_primary_key(table_info, value):
+    # regi tablaknal az _id a kulcs string alakja
+    if uses_native_keys(table_info):
+        return value
+    return str(value)
+
+def convert_attribute_value(attr, raw_value):
+    if attr["type"] == "int":
+        return int(raw_value)
+    elif attr["type"] == "float":
+        return float(raw_value)
+    return str(raw_value)
+
+# a "str" tipushoz nincs konverter, az ertek mar string
+ATTRIBUTE_CONVERTERS = {"int": int, "float": float}
+
+row_decoder_cache = {}
+row_decoder_cache_version = None
+row_decoder_cache_lock = threading.Lock()
+
+# as_tuple eseten a sor a decoded_column_names sorrendjeben allo tuple, kulonben dict
+def compile_row_decoder(table_info, columns=None, as_tuple=False):
+    attributes = table_info["attributes"]
+    pk_name = attributes[0]["name"]
+    pk_converter = ATTRIBUTE_CONVERTERS.get(attributes[0]["type"])
+    emit_pk = columns is None or pk_name in columns
+
+    def decode_pk(_id_value):
+        if pk_converter is None:
+            return _id_value
+        try:
+            return pk_converter(_id_value)
+        except (ValueError, TypeError):
+            return _id_value
+
+    if uses_field_storage(table_info):
+        field_names = [
+            attr["name"] for attr in attributes[1:]
+            if columns is None or attr["name"] in columns
+        ]
+
+        def decode_fields(doc):
+            get = doc.get
+            row = {pk_name: decode_pk(doc["_id"])} if emit_pk else {}
+            for name in field_names:
+                row[name] = get(name)
+            return row
+
+        def decode_fields_tuple(doc):
+            get = doc.get
+            if emit_pk:
+                return (decode_pk(doc["_id"]), *[get(name) for name in field_names])
+            return tuple([get(name) for name in field_names])
+        return decode_fields_tuple if as_tuple else decode_fields
+
+    # regi formatum: a "#"-el osszefuzott value string pozicioi
+    positioned_converters = [
+        (position, attr["name"], ATTRIBUTE_CONVERTERS.get(attr["type"]))
+        for position, attr in enumerate(attributes[1:])
+        if columns is None or attr["name"] in columns
+    ]
+
+    def decode_value_string(doc):
+        value_str = doc.get("value")
+        parts = value_str.split("#") if value_str else []
+        part_count = len(parts)
+        row = {pk_name: decode_pk(doc["_id"])} if emit_pk else {}
+        for position, name, converter in positioned_converters:
+            if position >= part_count:
+                row[name] = None
+            elif converter is None:
+                row[name] = parts[position]
+            else:
+                try:
+                    row[name] = converter(parts[position])
+                except ValueError:
+                    row[name] = None
+        return row
+
+    def decode_value_string_tuple(doc):
+        value_str = doc.get("value")
+        parts = value_str.split("#") if value_str else []
+        part_count = len(parts)
+        values = [decode_pk(doc["_id"])] if emit_pk else []
+        for position, name, converter in positioned_converters:
+            if position >= part_count:
+                values.append(None)
+            elif converter is None:
+                values.append(parts[position])
+            else:
+                try:
+                    values.append(converter(parts[position]))
+                except ValueError:
+                    values.append(None)
+        return tuple(values)
+    return decode_value_string_tuple if as_tuple else decode_value_string
+
+def get_row_decoder(db_name, table_info, columns=None, as_tuple=False):
+    # a katalogus verzioja minden DDL utan no, ilyenkor az osszes dekodert ujraforditjuk
+    global row_decoder_cache_version
+    key = (db_name, table_info["name"], frozenset(columns) if columns is not None else None, as_tuple)
+    with row_decoder_cache_lock:
+        if row_decoder_cache_version != catalog.version:
+            row_decoder_cache.clear()
+            row_decoder_cache_version = catalog.version
+        decoder = row_decoder_cache.get(key)
+        if decoder is None:
+            decoder = compile_row_decoder(table_info, columns, as_tuple)
+            row_decoder_cache[key] = decoder
+    return decoder
+
+def decoded_column_names(table_info, columns=None):
+    # a dekodolt sor oszlopai a compile_row_decoder sorrendjeben
+    attributes = table_info["attributes"]
+    names = [attr["name"] for attr in attributes[1:] if columns is None or attr["name"] in columns]
+    if columns is None or attributes[0]["name"] in columns:
+        names.insert(0, attributes[0]["name"])
+    return names
+
+def get_scan_projection(table_info, columns=None):
+    if columns is None or not uses_field_storage(table_info):
+        return None
+    return {name: 1 for name in columns if name != table_info["attributes"][0]["name"]} or {"_id": 1}
+
+def build_document(table_info, converted_values):
+    attributes = table_info["attributes"]
+    _id_value = encode_primary_key(table_info, converted_values[0])
+    if uses_field_storage(table_info):
+        document = {"_id": _id_value}
+        for attr, value in zip(attributes[1:], converted_values[1:]):
+            document[attr["name"]] = value
+        return document
+    return {"_id": _id_value, "value": "#".join(str(v) for v in converted_values[1:])}
+
+def migrate_table(table_name, session):
+    mongo_db = session.mongo_db
+    if mongo_db is None:
+        return "Error: No database selected"
+
+    db = get_current_database(session)
+    if not db:
+        return "Error: No database selected in catalog."
+    table_info = catalog.get_table(db["name"], table_name)
+    if not table_info:
+        return f"Error: Table '{table_name}' does not exist."
+    if uses_field_storage(table_info) and uses_native_keys(table_info):
+        return f"Table '{table_name}' already uses typed field storage and native keys."
+
+    new_table_info = dict(table_info, storage=STORAGE_FIELDS, key_encoding=KEY_ENCODING_NATIVE)
+    collection = mongo_db[table_name]
+    migrated_count = 0
+    keys_changed = False
+    batch = []
+    # egy felbeszakadt migracio utan a string _id-ju dokumentumok egy resze mar mezokben tarol,
+    # ezert a dekodert dokumentumonkent valasztjuk
+    decode_legacy_row = compile_row_decoder(dict(table_info, storage=None))
+    decode_field_row = compile_row_decoder(dict(table_info, storage=STORAGE_FIELDS))
+    for doc in collection.find({"$or": [{"value": {"$exists": True}}, {"_id": {"$type": "string"}}]}):
+        row = decode_legacy_row(doc) if "value" in doc else decode_field_row(doc)
+        values = [row.get(attr["name"]) for attr in table_info["attributes"]]
+        new_doc = build_document(new_table_info, values)
+        if type(new_doc["_id"]) is type(doc["_id"]) and new_doc["_id"] == doc["_id"]:
+            batch.append(pymongo.ReplaceOne({"_id": doc["_id"]}, new_doc))
         else:
-            parsed_obj[attr["name"]] = None 
-    return parsed_obj
+            # az _id nem modosithato, ezert uj dokumentumot szurunk be es a regit toroljuk
+            batch.append(pymongo.InsertOne(new_doc))
+            batch.append(pymongo.DeleteOne({"_id": doc["_id"]}))
+            keys_changed = True
+        migrated_count += 1
+        if len(batch) >= MIGRATE_BATCH_SIZE:
+            collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+
+    with catalog.lock:
+        table_info["storage"] = STORAGE_FIELDS
+        table_info["key_encoding"] = KEY_ENCODING_NATIVE
+        catalog.save()
+    result_cache.invalidate(db["name"], table_name)
+
+    # az index kollekciok a regi _id-kat tartalmazzak, ujraepitjuk oket
+    if keys_changed:
+        for attr in table_info["attributes"][1:]:
+            for suffix, index_type in (("index", "NON_UNIQUE"), ("uniqindex", "UNIQUE")):
+                if index_registry.exists(mongo_db, f"{table_name}_{attr['name']}_{suffix}"):
+                    build_result = build_index(mongo_db, db["name"], table_info, attr["name"], index_type)
+                    if build_result.startswith("Error"):
+                        return build_result
+
+    return f"Migrated {migrated_count} record(s) of '{table_name}' to typed field storage with native keys"
+
+def find_existing_values(collection, field, values):
+    found = set()
+    values = list(values)
+    for i in range(0, len(values), CONSTRAINT_CHECK_BATCH_SIZE):
+        chunk = values[i:i + CONSTRAINT_CHECK_BATCH_SIZE]
+        for doc in collection.find({field: {"$in": chunk}}, {field: 1}):
+            found.add(doc[field])
+    return found
+
+def check_insert_constraints(mongo_db, db_name, table_info, rows):
+    # a teljes batch-et ellenorizzuk iras elott, igy hiba eseten semmi nem kerul be
+    table_name = table_info["name"]
+    attributes = table_info["attributes"]
+
+    new_ids = set()
+    for values in rows:
+        _id_value = encode_primary_key(table_info, values[0])
+        if _id_value in new_ids:
+            raise ValueError(f"A record with primary key '{_id_value}' already exists in table '{table_name}'")
+        new_ids.add(_id_value)
+    existing_ids = find_existing_values(mongo_db[table_name], "_id", new_ids)
+    if existing_ids:
+        raise ValueError(f"A record with primary key '{next(iter(existing_ids))}' already exists in table '{table_name}'")
+
+    for position, attr in enumerate(attributes):
+        name = attr["name"]
+
+        # fk ellenorzes
+        ref_table_info = catalog.get_table(db_name, name[:-3]) if name.endswith("_id") else None
+        if ref_table_info is not None:
+            ref_keys = {encode_primary_key(ref_table_info, values[position]) for values in rows}
+            missing_keys = ref_keys - find_existing_values(mongo_db[name[:-3]], "_id", ref_keys)
+            if missing_keys:
+                raise ValueError(f"Foreign key constraint failed for '{name}' with value '{next(iter(missing_keys))}' in table '{table_name}'")
+
+        uniq_index_name = f"{table_name}_{name}_uniqindex"
+        if position > 0 and index_registry.exists(mongo_db, uniq_index_name):
+            new_keys = set()
+            for values in rows:
+                if values[position] in new_keys:
+                    raise ValueError(f"Unique constraint failed for '{name}' with value '{values[position]}' in table '{table_name}'")
+                new_keys.add(values[position])
+            existing_keys = find_existing_values(mongo_db[uniq_index_name], "key", new_keys)
+            if existing_keys:
+                raise ValueError(f"Unique constraint failed for '{name}' with value '{next(iter(existing_keys))}' in table '{table_name}'")
+
+def update_indexes_for_new_rows(mongo_db, table_info, rows):
+    # indexenkent egyetlen bulk_write: nem unique indexnel ertekenkent csoportositott $push upsert.
+    # Egy index hibaja nem allitja meg a tobbit; a hibas indexek neveit adjuk vissza
+    table_name = table_info["name"]
+    failed_indexes = []
+    for position, attr in enumerate(table_info["attributes"][1:], start=1):
+        name = attr["name"]
+
+        uniq_index_name = f"{table_name}_{name}_uniqindex"
+        if index_registry.exists(mongo_db, uniq_index_name):
+            operations = [
+                pymongo.InsertOne({"key": values[position], "value": encode_primary_key(table_info, values[0])})
+                for values in rows if values[position] is not None
+            ]
+            if operations:
+                try:
+                    mongo_db[uniq_index_name].bulk_write(operations, ordered=False)
+                except pymongo.errors.BulkWriteError:
+                    failed_indexes.append(uniq_index_name)
 
-def insert_into_table(tokens):
+        index_name = f"{table_name}_{name}_index"
+        if index_registry.exists(mongo_db, index_name):
+            ids_by_key = {}
+            for values in rows:
+                if values[position] is not None:
+                    ids_by_key.setdefault(values[position], []).append(encode_primary_key(table_info, values[0]))
+            operations = [
+                pymongo.UpdateOne({"key": key}, {"$push": {"value": {"$each": ids}}}, upsert=True)
+                for key, ids in ids_by_key.items()
+            ]
+            if operations:
+                try:
+                    mongo_db[index_name].bulk_write(operations, ordered=False)
+                except pymongo.errors.BulkWriteError:
+                    failed_indexes.append(index_name)
+    return failed_indexes
+
+def insert_into_table(tokens, session):
+    mongo_db = session.mongo_db
     if tokens[1].upper() != "INTO" or "VALUES" not in tokens:
         return "Syntax error in INSERT"
 
@@ -200,9 +934,8 @@ def insert_into_table(tokens):
     if mongo_db is None:
         return "Error: No database selected"
 
-    catalog = load_catalog()
-    db = get_current_database(catalog)
-    table = next((t for t in db["tables"] if t["name"] == table_name), None)
+    db = get_current_database(session)
+    table = catalog.get_table(db["name"], table_name)
     if not table:
         return "Error: Table does not exist"
 
@@ -211,8 +944,7 @@ def insert_into_table(tokens):
         return f"Error: Expected {len(attributes)} values, got {len(values_raw)}"
     
     _id_value = None
-    value_string_parts = []
-    original_document = {}
+    converted_values = []
 
     for i, (attr, val_str) in enumerate(zip(attributes, values_raw)):
         name = attr["name"]
@@ -233,64 +965,25 @@ def insert_into_table(tokens):
         
         if i == 0:
             _id_value = str(converted_val)
-        else:
-            value_string_parts.append(str(converted_val))
-
-        original_document[name] = converted_val
-
-    final_value_string = "#".join(value_string_parts)
-
-    collection = mongo_db[table_name]
-    if collection.find_one({"_id": _id_value}):
-        return f"Error: A record with primary key '{_id_value}' already exists in table '{table_name}'"
+        converted_values.append(converted_val)
 
-    # fk ellenorzes
-    for attr in attributes:
-        name = attr["name"]
-        if name.endswith("_id"):
-            ref_table = name[:-3]
-            ref_key_val_raw = original_document.get(name)
-
-            ref_key_val = str(ref_key_val_raw)
-
-            if ref_table in mongo_db.list_collection_names():
-                ref_coll = mongo_db[ref_table]
-                if ref_coll.find_one({"_id": ref_key_val}) is None:
-                    return f"Error: Foreign key constraint failed for '{name}' with value '{ref_key_val}' in table '{table_name}'"
-                
-    collection.insert_one({"_id": _id_value, "value": final_value_string})
-
-    # index kezeles
-    for attr in attributes[1:]:
-        name = attr["name"]
-        value = original_document.get(name)
-
-        if value is None:
-            continue
-
-        uniq_index_name = f"{table_name}_{name}_uniqindex"
-        if uniq_index_name in mongo_db.list_collection_names():
-            uniq_index = mongo_db[uniq_index_name]
+    try:
+        check_insert_constraints(mongo_db, db["name"], table, [converted_values])
+    except ValueError as ve:
+        return f"Error: {ve}"
 
-            if uniq_index.find_one({"key": value}):
-                return f"Error: Unique constraint failed for '{name}' with value '{value}' in table '{table_name}'"
-            uniq_index.insert_one({"key": value, "value": _id_value})
+    try:
+        mongo_db[table_name].insert_one(build_document(table, converted_values))
+        failed_indexes = update_indexes_for_new_rows(mongo_db, table, [converted_values])
+    finally:
+        result_cache.invalidate(db["name"], table_name)
 
-        index_name = f"{table_name}_{name}_index"
-        if index_name in mongo_db.list_collection_names():
-            index_coll = mongo_db[index_name]
-            existing = index_coll.find_one({"key": value})
-            if existing:
-                index_coll.update_one(
-                    {"_id": existing["_id"]},
-                    {"$push": {"value": _id_value}}
-                )
-            else:
-                index_coll.insert_one({"key": value, "value": [_id_value]})
-    
+    if failed_indexes:
+        return f"Error: Row inserted into {table_name} with key {_id_value}, but index maintenance failed for {', '.join(failed_indexes)}; run REPAIR INDEXES"
     return f"Row inserted into {table_name} with key {_id_value}"
 
-def delete_from_table(tokens):
+def delete_from_table(tokens, session):
+    mongo_db = session.mongo_db
     if len(tokens) < 5 or tokens[1].upper() != "FROM" or "WHERE" not in tokens:
         return "Syntax error in DELETE"
 
@@ -308,29 +1001,26 @@ def delete_from_table(tokens):
     if mongo_db is None:
         return "Error: No database selected"
 
-    catalog = load_catalog()
-    db = get_current_database(catalog)
+    db = get_current_database(session)
     if not db:
         return "Error: No database selected in catalog"
 
-    table_info = next((t for t in db["tables"] if t["name"] == table_name), None)
+    table_info = catalog.get_table(db["name"], table_name)
     if not table_info:
         return f"Error: Table '{table_name}' does not exist in the current database."
     attributes = table_info["attributes"]
 
     collection = mongo_db[table_name]
+    decode_row = get_row_decoder(db["name"], table_info)
     keys_to_delete_as_ids = []  # torlendo id-k
     
     # ha _id mezore vonatkozik
     if cond_field == attributes[0]["name"]:
         try:
             pk_type = attributes[0]["type"]
-            if pk_type == "int":
-                cond_value_for_id_lookup = str(int(cond_value_parsed))
-            elif pk_type == "float":
-                cond_value_for_id_lookup = str(float(cond_value_parsed))
-            else:
-                cond_value_for_id_lookup = cond_value_parsed
+            cond_value_for_id_lookup = encode_primary_key(
+                table_info, convert_attribute_value(attributes[0], cond_value_parsed)
+            )
         except ValueError:
             return f"Error: Type mismatch for primary key condition: expected {pk_type}, got {cond_value_parsed}"
         
@@ -342,7 +1032,7 @@ def delete_from_table(tokens):
         uniq_index_collection_name = f"{table_name}_{cond_field}_uniqindex"
 
         found_in_index = False
-        if index_collection_name in mongo_db.list_collection_names():
+        if index_registry.exists(mongo_db, index_collection_name):
             index_collection = mongo_db[index_collection_name]
             index_entry = index_collection.find_one({"key": cond_value_parsed})
 
@@ -352,20 +1042,28 @@ def delete_from_table(tokens):
                 else:
                     keys_to_delete_as_ids.append(index_entry["value"])
                 found_in_index = True
-        elif uniq_index_collection_name in mongo_db.list_collection_names():
+        elif index_registry.exists(mongo_db, uniq_index_collection_name):
             uniq_index_coll = mongo_db[uniq_index_collection_name]
             uniq_index_entry = uniq_index_coll.find_one({"key": cond_value_parsed})
             if uniq_index_entry:
                 keys_to_delete_as_ids.append(uniq_index_entry["value"])
                 found_in_index = True
 
-        if not found_in_index:
+        if not found_in_index and uses_field_storage(table_info):
+            # tipusos mezoknel a szurest a MongoDB vegzi
+            cond_attr = next((a for a in attributes if a["name"] == cond_field), None)
+            try:
+                typed_cond_value = convert_attribute_value(cond_attr, cond_value_parsed) if cond_attr else None
+            except ValueError:
+                typed_cond_value = None
+            if typed_cond_value is not None:
+                for doc in collection.find({cond_field: typed_cond_value}, {"_id": 1}):
+                    keys_to_delete_as_ids.append(doc["_id"])
+        elif not found_in_index:
             for doc in collection.find({}):
                 doc_id_string = doc["_id"]
-                doc_value_string = doc["value"]
 
-                parsed_doc_values = parse_value_string_to_dict(doc_value_string, attributes)
-                parsed_doc_values[attributes[0]["name"]] = doc_id_string  # hozzaadjuk az _id-t
+                parsed_doc_values = decode_row(doc)
                 
                 current_val_for_comparison = parsed_doc_values.get(cond_field)
 
@@ -396,9 +1094,11 @@ def delete_from_table(tokens):
                     foreign_key_column_name_in_ref_table = other_attr["name"]
                     fk_index_name_in_ref_table = f"{referenced_table_name}_{foreign_key_column_name_in_ref_table}_index"
                     
-                    if fk_index_name_in_ref_table in mongo_db.list_collection_names():
+                    if index_registry.exists(mongo_db, fk_index_name_in_ref_table):
                         fk_index_coll = mongo_db[fk_index_name_in_ref_table]
-                        if fk_index_coll.find_one({"key": _id_to_delete_string}) is not None:
+                        # az fk index kulcsa a tipusos ertek, nem az _id kodolt alakja
+                        referenced_key = ATTRIBUTE_CONVERTERS.get(attributes[0]["type"], str)(_id_to_delete_string)
+                        if fk_index_coll.find_one({"key": referenced_key}) is not None:
                             return f"Error: Cannot delete record with _id '{_id_to_delete_string}' from table '{table_name}' because it is referenced in table '{referenced_table_name}' by '{foreign_key_column_name_in_ref_table}'."
                     else:
                         print("Nem törlöm ki, csinálj rá indexet BOSS.")
@@ -414,8 +1114,7 @@ def delete_from_table(tokens):
         collection.delete_one({"_id": _id_to_delete_string}) # Torles az _id mezo alapjan
         deleted_count += 1
 
-        parsed_doc_values_for_index_deletion = parse_value_string_to_dict(doc["value"], attributes)
-        parsed_doc_values_for_index_deletion[attributes[0]["name"]] = _id_to_delete_string # _id hozzaadva a parsolt dictbe
+        parsed_doc_values_for_index_deletion = decode_row(doc)
 
         for attr in attributes:
             if attr["name"] == attributes[0]["name"]: 
@@ -428,25 +1127,21 @@ def delete_from_table(tokens):
             uniq_name = f"{table_name}_{attr['name']}_uniqindex"
             index_name = f"{table_name}_{attr['name']}_index"
 
-            if uniq_name in mongo_db.list_collection_names():
+            if index_registry.exists(mongo_db, uniq_name):
                 mongo_db[uniq_name].delete_one({"key": value})
 
-            if index_name in mongo_db.list_collection_names():
+            if index_registry.exists(mongo_db, index_name):
                 index_coll = mongo_db[index_name]
-                existing = index_coll.find_one({"key": value})
-                if existing:
-                    index_coll.update_one(
-                        {"_id": existing["_id"]}, # az index dokumentum _id-ja alapjan
-                        {"$pull": {"value": _id_to_delete_string}}
-                    )
-                    # aa az eltavolitas utan ures lesz a 'value' lista, toroljuk az index bejegyzest
-                    updated_existing = index_coll.find_one({"_id": existing["_id"]})
-                    if updated_existing and not updated_existing["value"]: # ha ures lett alista
-                        index_coll.delete_one({"_id": updated_existing["_id"]})
+                index_coll.update_one({"key": value}, {"$pull": {"value": _id_to_delete_string}})
+                # ha az eltavolitas utan ures lesz a 'value' lista, toroljuk az index bejegyzest
+                index_coll.delete_one({"key": value, "value": {"$size": 0}})
 
+    if deleted_count:
+        result_cache.invalidate(db["name"], table_name)
     return f"Deleted {deleted_count} record(s) from {table_name} where {cond_field} = {cond_value_parsed}"
 
-def create_index(tokens):
+def create_index(tokens, session):
+    mongo_db = session.mongo_db
     if len(tokens) < 5 or tokens[-2].upper() != "ON":
         return "Syntax error in CREATE INDEX"
 
@@ -462,12 +1157,11 @@ def create_index(tokens):
     if mongo_db is None:
         return "Error: No database selected"
     
-    catalog = load_catalog()
-    db = get_current_database(catalog)
+    db = get_current_database(session)
     if not db:
         return "Error: No database selected in catalog."
     
-    table_info = next((t for t in db["tables"] if t["name"] == table_name), None)
+    table_info = catalog.get_table(db["name"], table_name)
     if not table_info:
         return f"Error: Table '{table_name}' not found in catalog. Cannot create index."
     attributes = table_info["attributes"]
@@ -479,21 +1173,31 @@ def create_index(tokens):
     if field_name == attributes[0]["name"]:
         return f"Error: Primary key field '{field_name}' cannot be explicitly indexed. It is already indexed as 'key'."
 
+    result = build_index(mongo_db, db["name"], table_info, field_name, index_type)
+    result_cache.invalidate(db["name"], table_name)
+    return result
+
+def build_index(mongo_db, db_name, table_info, field_name, index_type):
+    table_name = table_info["name"]
     source_collection = mongo_db[table_name]
+    index_columns = {field_name}
+    decode_row = get_row_decoder(db_name, table_info, index_columns)
+    scan_projection = get_scan_projection(table_info, index_columns)
     index_collection_name = f"{table_name}_{field_name}_{'uniqindex' if index_type == 'UNIQUE' else 'index'}"
 
-    if index_collection_name in mongo_db.list_collection_names():
+    if index_registry.exists(mongo_db, index_collection_name):
         mongo_db.drop_collection(index_collection_name)
     mongo_db.create_collection(index_collection_name)
+    index_registry.add(mongo_db, index_collection_name)
     index_collection = mongo_db[index_collection_name]
+    ensure_key_index(index_collection)
 
     if index_type == "NON_UNIQUE":
         value_map = {}
-        for row in source_collection.find({}):
+        for row in source_collection.find({}, scan_projection):
             _id_string = row["_id"]
-            value_string = row["value"]
             
-            parsed_value_obj = parse_value_string_to_dict(value_string, attributes)
+            parsed_value_obj = decode_row(row)
             
             field_value = parsed_value_obj.get(field_name)
 
@@ -504,55 +1208,845 @@ def create_index(tokens):
                 value_map[field_value] = []
             value_map[field_value].append(_id_string)
 
-        for value, ids in value_map.items():
-            try:
-                index_collection.insert_one({"key": value, "value": ids})
-            except pymongo.errors.PyMongoError as e:
-                return f"Error inserting into index collection {index_collection_name}: {e}"
+        try:
+            if value_map:
+                index_collection.insert_many(
+                    [{"key": value, "value": ids} for value, ids in value_map.items()], ordered=False
+                )
+        except pymongo.errors.PyMongoError as e:
+            return f"Error inserting into index collection {index_collection_name}: {e}"
                 
     else: # UNIQUE index
-        for row in source_collection.find({}):
+        unique_map = {}
+        for row in source_collection.find({}, scan_projection):
             _id_string = row["_id"]
-            value_string = row["value"]
             
-            parsed_value_obj = parse_value_string_to_dict(value_string, attributes)
+            parsed_value_obj = decode_row(row)
             
             field_value = parsed_value_obj.get(field_name)
 
             if field_value is None:
                 continue
 
-            if index_collection.find_one({"key": field_value}) is not None:
+            if field_value in unique_map:
+                mongo_db.drop_collection(index_collection_name)
+                index_registry.discard(mongo_db, index_collection_name)
                 return f"Error: Duplicate value '{field_value}' found for UNIQUE index on '{field_name}' in table '{table_name}'. Index creation failed."
+            unique_map[field_value] = _id_string
             
-            try:
-                index_collection.insert_one({"key": field_value, "value": _id_string})
-            except pymongo.errors.PyMongoError as e:
-                return f"Error inserting into unique index collection {index_collection_name}: {e}"
+        try:
+            if unique_map:
+                index_collection.insert_many(
+                    [{"key": value, "value": _id_string} for value, _id_string in unique_map.items()], ordered=False
+                )
+        except pymongo.errors.PyMongoError as e:
+            return f"Error inserting into unique index collection {index_collection_name}: {e}"
 
     return f"{'Unique' if index_type == 'UNIQUE' else 'Non-unique'} index created on '{field_name}' in table '{table_name}'"
 
+def ensure_key_index(index_collection):
+    # mindket indextipusnal kulcsertekenkent egy dokumentum van, ezert a "key" mezo egyedi
+    index_collection.create_index([("key", pymongo.ASCENDING)], unique=True, name=KEY_INDEX_NAME)
+
+def repair_indexes(session):
+    mongo_db = session.mongo_db
+    if mongo_db is None:
+        return "Error: No database selected"
+
+    repaired = []
+    failed = []
+    for index_collection_name in index_registry.collection_names(mongo_db):
+        index_collection = mongo_db[index_collection_name]
+        if KEY_INDEX_NAME in index_collection.index_information():
+            continue
+
+        if index_collection_name.endswith("_index"):
+            # a regi, nem unique index kollekciokban ugyanaz a kulcs tobbszor is elofordulhat
+            documents_by_key = {}
+            for entry in index_collection.find({}):
+                documents_by_key.setdefault(entry["key"], []).append(entry)
+            for key, entries in documents_by_key.items():
+                if len(entries) < 2:
+                    continue
+                merged_ids = []
+                for entry in entries:
+                    merged_ids.extend(entry["value"] if isinstance(entry["value"], list) else [entry["value"]])
+                index_collection.update_one({"_id": entries[0]["_id"]}, {"$set": {"value": merged_ids}})
+                index_collection.delete_many({"_id": {"$in": [entry["_id"] for entry in entries[1:]]}})
+
+        try:
+            ensure_key_index(index_collection)
+            repaired.append(index_collection_name)
+        except pymongo.errors.PyMongoError as e:
+            failed.append(f"{index_collection_name} ({e})")
+
+    result = f"Repaired key index on {len(repaired)} index collection(s)"
+    if failed:
+        result += f". Failed: {', '.join(failed)}"
+    return result
+
+def compute_column_statistics(values, row_count):
+    column_stats = {"distinct": len(set(values)), "null_count": row_count - len(values)}
+    try:
+        values.sort()
+    except TypeError:
+        # vegyes tipusu oszlopra nem kesz hisztogram
+        return column_stats
+    if values:
+        column_stats["min"] = values[0]
+        column_stats["max"] = values[-1]
+        # egyenlo gyakorisagu hisztogram: a savhatarok a rendezett ertekek kvantilisei
+        column_stats["histogram"] = [
+            values[(i * (len(values) - 1)) // HISTOGRAM_BUCKETS] for i in range(HISTOGRAM_BUCKETS + 1)
+        ]
+    return column_stats
+
+def analyze_table(table_name, session):
+    mongo_db = session.mongo_db
+    if mongo_db is None:
+        return "Error: No database selected"
+    db = get_current_database(session)
+    if not db:
+        return "Error: Database not found in catalog"
+    table_info = catalog.get_table(db["name"], table_name)
+    if not table_info:
+        return f"Error: Table '{table_name}' does not exist."
+
+    decode_row = get_row_decoder(db["name"], table_info)
+    column_values = {attr["name"]: [] for attr in table_info["attributes"]}
+    row_count = 0
+    for doc in mongo_db[table_name].find({}, get_scan_projection(table_info)):
+        row = decode_row(doc)
+        row_count += 1
+        for column_name, values in column_values.items():
+            value = row.get(column_name)
+            if value is not None:
+                values.append(value)
+
+    statistics = {
+        "row_count": row_count,
+        "columns": {
+            column_name: compute_column_statistics(values, row_count)
+            for column_name, values in column_values.items()
+        },
+    }
+
+    with catalog.lock:
+        table_info = catalog.get_table(db["name"], table_name)
+        if table_info is None:
+            return f"Error: Table '{table_name}' does not exist."
+        table_info["statistics"] = statistics
+        catalog.save()
+
+    return f"Analyzed table '{table_name}': {row_count} rows, {len(column_values)} columns."
+
+def parse_literal(val):
+    try:
+        return int(val)
+    except ValueError:
+        try:
+            return float(val)
+        except ValueError:
+            return val.strip('"').strip("'")
+
 def parse_condition(cond):
-    match = re.match(r'([\w.]+)\s*(=|<=|>=|<|>)\s*(.+)', cond)
+    match = condition_pattern.match(cond)
     if match:
         field, op, val = match.groups()
-        try:
-            val = int(val)
-        except ValueError:
-            try:
-                val = float(val)
-            except ValueError:
-                val = val.strip('"').strip("'")
-        return field, op, val
+        return field, op, parse_literal(val)
+    return None
+
+MONGO_COMPARISON_OPERATORS = {"=": "$eq", ">": "$gt", "<": "$lt", ">=": "$gte", "<=": "$lte"}
+
+def push_down_primary_key_condition(mongo_filter, table_info, op, value):
+    pk_attr = table_info["attributes"][0]
+    if uses_native_keys(table_info):
+        return push_down_field_condition(mongo_filter, dict(pk_attr, name="_id"), op, value)
+    # a regi string kulcsok lexikografikusan rendezodnek ("100" < "9"), ott csak az egyenloseg adhato at
+    if op != "=" or "_id" in mongo_filter:
+        return False
+    mongo_filter["_id"] = str(value)
+    return True
+
+def is_comparable_literal(attr, value):
+    # csak akkor adjuk at a MongoDB-nek, ha az osszehasonlitas ugyanugy viselkedik, mint a Python oldali szures
+    if attr["type"] in ("int", "float"):
+        return isinstance(value, (int, float))
+    return isinstance(value, str)
+
+def push_down_field_condition(mongo_filter, attr, op, value):
+    if attr is None or not is_comparable_literal(attr, value):
+        return False
+
+    field_filter = mongo_filter.setdefault(attr["name"], {})
+    mongo_op = MONGO_COMPARISON_OPERATORS[op]
+    if mongo_op in field_filter:
+        return False
+    field_filter[mongo_op] = value
+    return True
+
+def collect_referenced_columns(parsed_statement, alias, table_info):
+    # None = minden oszlop kell (SELECT *)
+    if "*" in parsed_statement["columns"]:
+        return None
+
+    field_specs = []
+    for col_spec in parsed_statement["columns"] + parsed_statement["group_by_columns"]:
+        agg_match = aggregate_pattern.match(col_spec)
+        field_specs.append(agg_match.group(2) if agg_match else col_spec)
+    for agg_func_info in parsed_statement["aggregate_functions"]:
+        field_specs.append(agg_func_info["field"])
+    for order_col in parsed_statement["order_by_columns"]:
+        agg_match = aggregate_pattern.match(order_col["field"])
+        field_specs.append(agg_match.group(2) if agg_match else order_col["field"])
+    for cond_str in parsed_statement["where_conditions"]:
+        parsed_cond = parse_condition(cond_str)
+        if parsed_cond:
+            field_specs.append(parsed_cond[0])
+    for join_clause in parsed_statement["joins"]:
+        field_specs.append(join_clause["on_condition"]["left"])
+        field_specs.append(join_clause["on_condition"]["right"])
+
+    attribute_names = {attr["name"] for attr in table_info["attributes"]}
+    columns = set()
+    for field_spec in field_specs:
+        if "." in field_spec:
+            field_alias, field_name = field_spec.split(".", 1)
+            if field_alias == alias and field_name in attribute_names:
+                columns.add(field_name)
+        elif field_spec in attribute_names:
+            columns.add(field_spec)
+    return columns
+
+def choose_index_access_path(mongo_db, table_info, conditions):
+    table_name = table_info["name"]
+    pk_name = table_info["attributes"][0]["name"]
+    attributes_by_name = {attr["name"]: attr for attr in table_info["attributes"]}
+
+    # egyenloseg unique indexen < egyenloseg < tartomany
+    best = None
+    for cond in conditions:
+        attr = attributes_by_name.get(cond["field_name"])
+        if attr is None or attr["name"] == pk_name or not is_comparable_literal(attr, cond["value"]):
+            continue
+        for suffix, rank_offset in (("uniqindex", 0), ("index", 1)):
+            index_collection_name = f"{table_name}_{attr['name']}_{suffix}"
+            if not index_registry.exists(mongo_db, index_collection_name):
+                continue
+            rank = (0 if cond["op"] == "=" else 2) + rank_offset
+            if best is None or rank < best[0]:
+                best = (rank, index_collection_name, attr)
+
+    if best is None:
+        return None
+
+    _, index_collection_name, attr = best
+    key_filter = {}
+    covered_conditions = []
+    for cond in conditions:
+        if cond["field_name"] != attr["name"] or not is_comparable_literal(attr, cond["value"]):
+            continue
+        mongo_op = MONGO_COMPARISON_OPERATORS[cond["op"]]
+        if mongo_op in key_filter:
+            continue
+        key_filter[mongo_op] = cond["value"]
+        covered_conditions.append(cond)
+
+    return {
+        "index_collection": index_collection_name,
+        "field_name": attr["name"],
+        "key_filter": key_filter,
+        "conditions": covered_conditions,
+        "is_range": "$eq" not in key_filter,
+    }
+
+def lookup_index_ids(mongo_db, access_path, max_ids=None):
+    # max_ids felett None: a cursort nem olvassuk vegig, ha a tartomany ugysem eleg szelektiv
+    ids = []
+    index_collection = mongo_db[access_path["index_collection"]]
+    cursor = index_collection.find({"key": access_path["key_filter"]}, {"value": 1})
+    for entry in cursor:
+        if isinstance(entry["value"], list):
+            ids.extend(entry["value"])
+        else:
+            ids.append(entry["value"])
+        if max_ids is not None and len(ids) > max_ids:
+            cursor.close()
+            return None
+    return ids
+
+def with_extra_filter(mongo_filter, extra_filter):
+    if extra_filter:
+        return {"$and": [mongo_filter, extra_filter]}
+    return mongo_filter
+
+def find_documents_by_ids(collection, ids, extra_filter=None, projection=None):
+    for i in range(0, len(ids), INDEX_ID_BATCH_SIZE):
+        id_filter = {"_id": {"$in": ids[i:i + INDEX_ID_BATCH_SIZE]}}
+        yield from collection.find(with_extra_filter(id_filter, extra_filter), projection)
+
+# koltsegbecsles: a sorszamot mindig a MongoDB-tol kerjuk (olcso es friss),
+# az ANALYZE statisztikait csak az aranyokhoz hasznaljuk
+def get_table_row_count(mongo_db, table_info):
+    return mongo_db[table_info["name"]].estimated_document_count()
+
+def get_column_statistics(table_info, column_name):
+    statistics = table_info.get("statistics")
+    if not statistics:
+        return None
+    return statistics["columns"].get(column_name)
+
+def estimate_distinct_values(table_info, column_name, row_count):
+    if column_name == table_info["attributes"][0]["name"]:
+        return row_count
+    column_stats = get_column_statistics(table_info, column_name)
+    if column_stats is None:
+        return None
+    distinct = column_stats["distinct"]
+    analyzed_rows = table_info["statistics"]["row_count"]
+    # a kozel egyedi oszlopok az ANALYZE ota beszurt sorokkal egyutt nonek
+    if analyzed_rows and distinct >= 0.9 * analyzed_rows:
+        distinct = distinct * row_count / analyzed_rows
+    return max(1, min(distinct, row_count))
+
+def histogram_fraction_below(histogram, value):
+    buckets = len(histogram) - 1
+    if buckets < 1:
+        return 0.5
+    if value <= histogram[0]:
+        return 0.0
+    if value > histogram[-1]:
+        return 1.0
+    position = bisect.bisect_left(histogram, value) - 1
+    low, high = histogram[position], histogram[position + 1]
+    within = 0.5
+    if isinstance(value, (int, float)) and isinstance(low, (int, float)) and high != low:
+        within = (value - low) / (high - low)
+    return (position + within) / buckets
+
+def estimate_condition_selectivity(table_info, cond, row_count):
+    column_stats = get_column_statistics(table_info, cond["field_name"])
+    op, value = cond["op"], cond["value"]
+    try:
+        if op == "=":
+            distinct = estimate_distinct_values(table_info, cond["field_name"], row_count)
+            if column_stats and "min" in column_stats and not column_stats["min"] <= value <= column_stats["max"]:
+                return 0.0
+            return 1.0 / distinct if distinct else DEFAULT_EQ_SELECTIVITY
+        if column_stats and "histogram" in column_stats:
+            below = histogram_fraction_below(column_stats["histogram"], value)
+            non_null = 1.0 - column_stats["null_count"] / max(1, table_info["statistics"]["row_count"])
+            return non_null * (below if op in ("<", "<=") else 1.0 - below)
+    except TypeError:
+        pass
+    return DEFAULT_EQ_SELECTIVITY if op == "=" else DEFAULT_RANGE_SELECTIVITY
+
+def estimate_filtered_rows(table_info, conditions, row_count):
+    rows = float(row_count)
+    for cond in conditions:
+        rows *= estimate_condition_selectivity(table_info, cond, row_count)
+    return rows
+
+# egy base tabla a lekerdezesben: a sajat WHERE felteteleivel es becsult sorszamaval
+def prepare_relation(mongo_db, db_info, parsed_statement, table_info, alias, conditions):
+    row_count = get_table_row_count(mongo_db, table_info)
+    columns = collect_referenced_columns(parsed_statement, alias, table_info)
+    relation = {
+        "alias": alias,
+        "table": table_info["name"],
+        "table_info": table_info,
+        "conditions": conditions,
+        "row_count": row_count,
+        "estimated_rows": estimate_filtered_rows(table_info, conditions, row_count),
+        "columns": columns,
+        "decode_row": get_row_decoder(db_info["name"], table_info, columns, as_tuple=True),
+        "projection": get_scan_projection(table_info, columns),
+        # a relacio sorainak oszlopai ("alias.mezo"), ebben a sorrendben all a sor tuple
+        "schema": [f"{alias}.{name}" for name in decoded_column_names(table_info, columns)],
+    }
+    relation["scan_cost"] = estimate_scan_cost(mongo_db, relation)
+    return relation
+
+def split_relation_conditions(table_info, conditions):
+    # ami atadhato, az a MongoDB filterbe kerul, a tobbi Python oldalon szurodik
+    attributes_by_name = {attr["name"]: attr for attr in table_info["attributes"]}
+    pk_name = table_info["attributes"][0]["name"]
+    mongo_filter = {}
+    python_side_conditions = []
+    for cond in conditions:
+        field_name, op, value = cond["field_name"], cond["op"], cond["value"]
+        if field_name == pk_name and push_down_primary_key_condition(mongo_filter, table_info, op, value):
+            continue
+        elif uses_field_storage(table_info) and \
+                push_down_field_condition(mongo_filter, attributes_by_name.get(field_name), op, value):
+            continue
+        else:
+            python_side_conditions.append(cond)
+    return mongo_filter, python_side_conditions
+
+def estimate_scan_cost(mongo_db, relation):
+    table_info = relation["table_info"]
+    pk_name = table_info["attributes"][0]["name"]
+    indexed = choose_index_access_path(mongo_db, table_info, relation["conditions"]) is not None or any(
+        cond["field_name"] == pk_name and (uses_native_keys(table_info) or cond["op"] == "=")
+        for cond in relation["conditions"]
+    )
+    if indexed:
+        return COST_ROUND_TRIP + relation["estimated_rows"] * COST_RANDOM_ROW
+    return COST_ROUND_TRIP + relation["row_count"] * COST_SEQ_ROW
+
+def has_ordered_key_scan(relation):
+    # nativ numerikus kulcsnal a MongoDB _id indexe a join kulcs szerint rendezve adja a sorokat
+    pk_attr = relation["table_info"]["attributes"][0]
+    return uses_native_keys(relation["table_info"]) and pk_attr["type"] in ("int", "float")
+
+def open_relation_scan(mongo_db, relation, key_order=None):
+    # a relacio dokumentumai es a Python oldalon szurendo feltetelek
+    table_info = relation["table_info"]
+    conditions = relation["conditions"]
+
+    # access path: ha egy nem kulcs oszlopra van indexunk, az index kollekciobol vesszuk az _id-kat
+    access_path = choose_index_access_path(mongo_db, table_info, conditions)
+    index_ids = None
+    if access_path:
+        max_ids = INDEX_RANGE_MAX_FRACTION * relation["row_count"] if access_path["is_range"] else None
+        index_ids = lookup_index_ids(mongo_db, access_path, max_ids)
+        if index_ids is None:
+            print(f"OPTIMIZER: Range on {access_path['index_collection']} is not selective. Using full scan.")
+        else:
+            print(f"OPTIMIZER: Using index {access_path['index_collection']} ({len(index_ids)} matching rows).")
+            conditions = [cond for cond in conditions if not any(cond is c for c in access_path["conditions"])]
+
+    mongo_filter, python_side_conditions = split_relation_conditions(table_info, conditions)
+    collection = mongo_db[relation["table"]]
+    if index_ids is not None:
+        documents = find_documents_by_ids(collection, index_ids, mongo_filter, relation["projection"])
+    elif key_order:
+        documents = collection.find(mongo_filter, relation["projection"]).sort("_id", key_order)
+    else:
+        documents = collection.find(mongo_filter, relation["projection"])
+    return documents, python_side_conditions
+
+def scan_relation(mongo_db, relation, key_order=None):
+    documents, python_side_conditions = open_relation_scan(mongo_db, relation, key_order)
+    return filter_rows(scan_rows(documents, relation["decode_row"]), python_side_conditions, relation["schema"])
+
+def find_documents_in_id_order(collection, ids, extra_filter=None, projection=None):
+    # mint a find_documents_by_ids, de a dokumentumokat az ids sorrendjeben adja vissza
+    for i in range(0, len(ids), INDEX_ID_BATCH_SIZE):
+        batch_ids = ids[i:i + INDEX_ID_BATCH_SIZE]
+        documents_by_id = {
+            doc["_id"]: doc
+            for doc in collection.find(with_extra_filter({"_id": {"$in": batch_ids}}, extra_filter), projection)
+        }
+        for _id in batch_ids:
+            doc = documents_by_id.get(_id)
+            if doc is not None:
+                yield doc
+
+def scan_relation_in_index_order(mongo_db, relation, field_name, direction):
+    # a rendezett index kollekcion megyunk vegig, igy a sorok mar ORDER BY szerint jonnek
+    table_info = relation["table_info"]
+    collection = mongo_db[relation["table"]]
+    index_collection_name = find_index_collection(mongo_db, relation["table"], field_name)
+    attr = next(attr for attr in table_info["attributes"] if attr["name"] == field_name)
+    has_field_condition = False
+    key_filter = {}
+    other_conditions = []
+    for cond in relation["conditions"]:
+        if cond["field_name"] != field_name:
+            other_conditions.append(cond)
+            continue
+        has_field_condition = True
+        mongo_op = MONGO_COMPARISON_OPERATORS[cond["op"]]
+        if mongo_op in key_filter or not is_comparable_literal(attr, cond["value"]):
+            other_conditions.append(cond)
+        else:
+            key_filter[mongo_op] = cond["value"]
+    mongo_filter, python_side_conditions = split_relation_conditions(table_info, other_conditions)
+    print(f"OPTIMIZER: Streaming rows in {index_collection_name} key order for ORDER BY.")
+
+    def documents():
+        index_entries = mongo_db[index_collection_name].find({"key": key_filter} if key_filter else {}, {"value": 1})
+        for entries in iterate_batches(index_entries.sort("key", direction), INDEX_ID_BATCH_SIZE):
+            ids = []
+            for entry in entries:
+                if isinstance(entry["value"], list): ids.extend(entry["value"])
+                else: ids.append(entry["value"])
+            yield from find_documents_in_id_order(collection, ids, mongo_filter, relation["projection"])
+        # a NULL ertekek nincsenek az indexben, ezek mindket iranyban a vegere kerulnek
+        if not has_field_condition:
+            yield from collection.find(with_extra_filter({field_name: None}, mongo_filter), relation["projection"])
+
+    return filter_rows(scan_rows(documents(), relation["decode_row"]), python_side_conditions, relation["schema"])
+
+def find_index_collection(mongo_db, table_name, field_name):
+    for suffix in ("uniqindex", "index"):
+        index_collection_name = f"{table_name}_{field_name}_{suffix}"
+        if index_registry.exists(mongo_db, index_collection_name):
+            return index_collection_name
     return None
 
-def execute_indexed_nested_loop_join(all_results, join_clause, db_info, mongo_db):
+def resolve_order_column(field_spec, relations):
+    # a resolve_sort_columns feloldasat koveti: minosites nelkul az elso olyan tabla, amelyiknek van ilyen oszlopa
+    if "." in field_spec:
+        alias, field_name = field_spec.split(".", 1)
+        for relation in relations:
+            if relation["alias"] == alias and any(attr["name"] == field_name for attr in relation["table_info"]["attributes"]):
+                return relation, field_name
+        return None
+    for relation in relations:
+        if any(attr["name"] == field_spec for attr in relation["table_info"]["attributes"]):
+            return relation, field_spec
+    return None
+
+def choose_key_order_scan(mongo_db, parsed_statement, relations, first_relation, join_order):
+    # ha az ORDER BY a kulcs vagy egy index sorrendje, rendezes helyett abban a sorrendben olvasunk
+    order_by_columns = parsed_statement["order_by_columns"]
+    if len(order_by_columns) != 1 or parsed_statement["group_by_columns"] or parsed_statement["aggregate_functions"]:
+        return None
+    resolved = resolve_order_column(order_by_columns[0]["field"], relations)
+    if resolved is None:
+        return None
+    relation, field_name = resolved
+    direction = -1 if order_by_columns[0]["direction"] == "DESC" else 1
+    table_info = relation["table_info"]
+    is_pk = field_name == table_info["attributes"][0]["name"]
+
+    if join_order is None:
+        if relation is not first_relation:
+            return None
+        if is_pk and has_ordered_key_scan(relation) and \
+                choose_index_access_path(mongo_db, table_info, relation["conditions"]) is None:
+            return {"kind": "key", "direction": direction}
+        access_path = choose_index_access_path(mongo_db, table_info, relation["conditions"])
+        if parsed_statement["limit"] is not None and not is_pk and uses_field_storage(table_info) and \
+                find_index_collection(mongo_db, relation["table"], field_name) and \
+                (access_path is None or access_path["field_name"] == field_name):
+            return {"kind": "index", "direction": direction, "field_name": field_name}
+        return None
+
+    # joinnal csak novekvo iranyban, ha a terv kimenete mar e szerint rendezett
+    order = join_order["order"]
+    column = f"{relation['alias']}.{field_name}"
+    if direction != 1 or order is None or column not in order["columns"]:
+        return None
+    if order["from_scan"]:
+        return {"kind": "key", "direction": 1}
+    # a merge join int kulcs szerint rendez, ez csak int oszlopnal egyezik az ORDER BY-jal
+    attr = next(attr for attr in table_info["attributes"] if attr["name"] == field_name)
+    if attr["type"] == "int":
+        return {"kind": "join", "direction": 1}
+    return None
+
+class ReverseKey:
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+NULL_SORT_KEY = (True,)
+
+def resolve_sort_columns(order_by_columns, schema):
+    # minosites nelkuli mezonel az elso olyan oszlop, ami .mezo-re vegzodik
+    key_columns = []
+    for order_col in order_by_columns:
+        column = order_col["field"]
+        if column not in schema and "." not in column:
+            column = next((name for name in schema if name.endswith(f".{column}")), column)
+        key_columns.append((schema_position(schema, column), order_col["direction"] == "DESC"))
+    return key_columns
+
+def order_by_sort_key(order_by_columns, schema):
+    # soronkent egyszer szamolt tuple kulcs; a NULL mindket iranyban a vegere kerul,
+    # a szamok szamkent, minden mas szovegkent rendezodik (szamok a szovegek elott)
+    key_columns = resolve_sort_columns(order_by_columns, schema)
+
+    def sort_key(row):
+        key = []
+        for position, descending in key_columns:
+            value = row[position] if position is not None else None
+            if value is None:
+                key.append(NULL_SORT_KEY)
+            elif isinstance(value, (int, float)):
+                key.append((False, 1, -value) if descending else (False, 0, value))
+            else:
+                text = value if isinstance(value, str) else str(value)
+                key.append((False, 0, ReverseKey(text)) if descending else (False, 1, text))
+        return tuple(key)
+
+    return sort_key
+
+def top_k_rows(items, k, distinct=False):
+    # items: (rendezesi kulcs, kimeneti sor) parok; a k legkisebb kulcsu sort adja, stabil rendezessel.
+    # distinct eseten a (hash-elheto) kimeneti sorok egyediek, mindegyik a legkisebb kulcsu elofordulasa helyen
+    if k <= 0:
+        return []
+    heap = []
+    entries = {}
+    valid_count = 0
+    for seq, (key, row) in enumerate(items):
+        sort_key = (key, seq)
+        row_id = row if distinct else seq
+        existing = entries.get(row_id)
+        if existing is not None:
+            if not sort_key < existing[0].key:
+                continue
+            existing[3] = False
+            valid_count -= 1
+            del entries[row_id]
+        # a kupac tetejen a legnagyobb ervenyes kulcs all
+        while heap and not heap[0][3]:
+            heapq.heappop(heap)
+        if valid_count >= k and not sort_key < heap[0][0].key:
+            continue
+        entry = [ReverseKey(sort_key), row_id, row, True]
+        heapq.heappush(heap, entry)
+        entries[row_id] = entry
+        valid_count += 1
+        if valid_count > k:
+            while True:
+                evicted = heapq.heappop(heap)
+                if evicted[3]:
+                    break
+            del entries[evicted[1]]
+            valid_count -= 1
+        if len(heap) > 2 * k + 16:
+            heap = [entry for entry in heap if entry[3]]
+            heapq.heapify(heap)
+
+    valid_entries = sorted((entry for entry in heap if entry[3]), key=lambda entry: entry[0].key)
+    return [entry[2] for entry in valid_entries]
+
+def estimate_sort_cost(rows):
+    cost = rows * math.log2(max(2, rows)) * COST_SORT_COMPARE
+    if rows * ESTIMATED_ROW_BYTES > SORT_MEMORY_BUDGET:
+        cost += rows * COST_SPILL_ROW
+    return cost
+
+def plan_join(mongo_db, outer_relation, outer_field_name, inner_relation, inner_field_name, outer_rows, outer_order=None):
+    inner_table_info = inner_relation["table_info"]
+    join_table_name = inner_relation["table"]
+    inner_rows = inner_relation["row_count"]
+    inner_selectivity = inner_relation["estimated_rows"] / max(1, inner_rows)
+
+    # kimeneti sorok: |R| * |S| / max(d(R.a), d(S.b)), az ismeretlen distinct helyett a masik oldalet hasznaljuk
+    inner_distinct = estimate_distinct_values(inner_table_info, inner_field_name, inner_rows)
+    outer_distinct = estimate_distinct_values(
+        outer_relation["table_info"], outer_field_name, outer_relation["row_count"]
+    )
+    if outer_distinct is not None:
+        outer_distinct = min(outer_distinct, max(1, outer_rows))
+    known_distinct = [d for d in (inner_distinct, outer_distinct) if d]
+    join_distinct = max(known_distinct) if known_distinct else max(1, inner_rows, outer_rows)
+    matched_rows = outer_rows * inner_rows / max(1, join_distinct)
+
+    is_pk_join = (inner_field_name == inner_table_info["attributes"][0]["name"])
+    has_secondary_index = index_registry.exists(mongo_db, f"{join_table_name}_{inner_field_name}_index")
+
+    costs = {}
+    if is_pk_join or has_secondary_index:
+        round_trips = math.ceil(outer_rows / JOIN_BATCH_SIZE) * (1 if is_pk_join else 2)
+        costs["inlj"] = round_trips * COST_ROUND_TRIP + matched_rows * COST_RANDOM_ROW + outer_rows * COST_HASH_PROBE_ROW
+
+    # hash join: a szurt belso tabla es a kulso oldal kozul a kisebbiket toltjuk a hash tablaba
+    filtered_inner_rows = inner_relation["estimated_rows"]
+    build_side = "inner" if filtered_inner_rows <= outer_rows else "outer"
+    build_rows, probe_rows = (
+        (filtered_inner_rows, outer_rows) if build_side == "inner" else (outer_rows, filtered_inner_rows)
+    )
+    costs["hash"] = (
+        COST_ROUND_TRIP + inner_rows * COST_SEQ_ROW
+        + build_rows * COST_HASH_BUILD_ROW + probe_rows * COST_HASH_PROBE_ROW
+    )
+    if build_rows * ESTIMATED_ROW_BYTES > HASH_JOIN_MEMORY_BUDGET:
+        costs["hash"] += (build_rows + probe_rows) * COST_SPILL_ROW
+
+    # sort-merge join: a mar rendezett oldalt nem kell rendezni
+    outer_sorted = outer_order is not None and f"{outer_relation['alias']}.{outer_field_name}" in outer_order["columns"]
+    inner_sorted = is_pk_join and has_ordered_key_scan(inner_relation)
+    costs["merge"] = (
+        COST_ROUND_TRIP + inner_rows * COST_SEQ_ROW
+        + (0 if outer_sorted else estimate_sort_cost(outer_rows))
+        + (0 if inner_sorted else estimate_sort_cost(filtered_inner_rows))
+        + (outer_rows + filtered_inner_rows) * COST_MERGE_ROW
+    )
+
+    algorithm = min(costs, key=costs.get)
+    if algorithm == "inlj":
+        # az INLJ megtartja a kulso oldal sorrendjet
+        output_order = outer_order
+    elif algorithm == "merge":
+        output_order = {
+            "columns": frozenset([f"{outer_relation['alias']}.{outer_field_name}", f"{inner_relation['alias']}.{inner_field_name}"]),
+            "from_scan": False,
+        }
+    else:
+        output_order = None
+    return {
+        "algorithm": algorithm,
+        "build_side": build_side if algorithm == "hash" else None,
+        "outer_sorted": outer_sorted if algorithm == "merge" else None,
+        "inner_sorted": inner_sorted if algorithm == "merge" else None,
+        "costs": costs,
+        "cost": costs[algorithm],
+        "outer_rows": outer_rows,
+        "estimated_rows": matched_rows * inner_selectivity,
+        "output_order": output_order,
+        "uses_scan_order": algorithm == "merge" and outer_sorted and outer_order["from_scan"],
+    }
+
+def parse_join_edges(joins, relations_by_alias):
+    edges = []
+    for join_clause in joins:
+        on_condition = join_clause["on_condition"]
+        sides = []
+        for field_spec in (on_condition["left"], on_condition["right"]):
+            if "." not in field_spec:
+                return None, f"Error: JOIN ON condition must use alias.column format: {field_spec}"
+            alias, field_name = field_spec.split(".", 1)
+            if alias not in relations_by_alias:
+                return None, f"Error: Unknown table alias '{alias}' in JOIN ON condition."
+            sides.append((alias, field_name))
+        if sides[0][0] == sides[1][0] or join_clause["alias"] not in (sides[0][0], sides[1][0]):
+            return None, f"Error: JOIN ON condition for '{join_clause['alias']}' must compare it with another table."
+        edges.append({"fields": dict(sides)})
+    return edges, None
+
+def plan_join_step(mongo_db, joined_aliases, outer_rows, relation, edges, relations_by_alias, outer_order=None):
+    # az elso osszekoto feltetel a join kulcs, a tobbit a join utan szurjuk
+    connecting = [
+        edge for edge in edges
+        if relation["alias"] in edge["fields"]
+        and any(alias in joined_aliases for alias in edge["fields"] if alias != relation["alias"])
+    ]
+    if not connecting:
+        return None
+    edge = connecting[0]
+    outer_alias = next(alias for alias in edge["fields"] if alias != relation["alias"])
+    step = plan_join(
+        mongo_db, relations_by_alias[outer_alias], edge["fields"][outer_alias],
+        relation, edge["fields"][relation["alias"]], outer_rows, outer_order,
+    )
+    step["relation"] = relation
+    step["outer_alias"] = outer_alias
+    step["outer_field_name"] = edge["fields"][outer_alias]
+    step["inner_field_name"] = edge["fields"][relation["alias"]]
+    step["residual_edges"] = connecting[1:]
+    return step
+
+def initial_scan_order(mongo_db, relation):
+    # a kezdo tabla kerheto _id sorrendben, ha nem index access path-szal olvassuk
+    if not has_ordered_key_scan(relation) or choose_index_access_path(mongo_db, relation["table_info"], relation["conditions"]):
+        return None
+    pk_name = relation["table_info"]["attributes"][0]["name"]
+    return {"columns": frozenset([f"{relation['alias']}.{pk_name}"]), "from_scan": True}
+
+def choose_join_order(mongo_db, relations, edges):
+    relations_by_alias = {relation["alias"]: relation for relation in relations}
+
+    # egy reszterv: koltseg, becsult sorok, kezdo tabla, lepesek, a kimenet rendezettsege
+    def start_plan(relation):
+        return {
+            "cost": relation["scan_cost"],
+            "rows": relation["estimated_rows"],
+            "first_relation": relation,
+            "steps": [],
+            "order": initial_scan_order(mongo_db, relation),
+        }
+
+    def extend_plan(plan, step):
+        return {
+            "cost": plan["cost"] + step["cost"],
+            "rows": step["estimated_rows"],
+            "first_relation": plan["first_relation"],
+            "steps": plan["steps"] + [step],
+            "order": step["output_order"],
+        }
+
+    if len(relations) <= JOIN_DP_MAX_RELATIONS:
+        # dinamikus programozas a bal-mely fakon, reszhalmazonkent a legolcsobb tervet tartjuk meg
+        best = {frozenset([relation["alias"]]): start_plan(relation) for relation in relations}
+        for _ in range(len(relations) - 1):
+            next_best = {}
+            for joined_aliases, plan in best.items():
+                for relation in relations:
+                    if relation["alias"] in joined_aliases:
+                        continue
+                    step = plan_join_step(
+                        mongo_db, joined_aliases, plan["rows"], relation, edges, relations_by_alias, plan["order"]
+                    )
+                    if step is None:
+                        continue
+                    key = joined_aliases | {relation["alias"]}
+                    candidate = extend_plan(plan, step)
+                    if key not in next_best or candidate["cost"] < next_best[key]["cost"]:
+                        next_best[key] = candidate
+            best = next_best
+        if not best:
+            return None
+        return min(best.values(), key=lambda plan: plan["cost"])
+
+    # moho: a legkisebb becsult tablabol indulunk, mindig a legolcsobb kapcsolodo tablat vesszuk hozza
+    plan = start_plan(min(relations, key=lambda relation: relation["estimated_rows"]))
+    joined_aliases = {plan["first_relation"]["alias"]}
+    while len(joined_aliases) < len(relations):
+        candidates = [
+            plan_join_step(mongo_db, joined_aliases, plan["rows"], relation, edges, relations_by_alias, plan["order"])
+            for relation in relations if relation["alias"] not in joined_aliases
+        ]
+        candidates = [step for step in candidates if step is not None]
+        if not candidates:
+            return None
+        step = min(candidates, key=lambda candidate: (candidate["cost"], candidate["estimated_rows"]))
+        plan = extend_plan(plan, step)
+        joined_aliases.add(step["relation"]["alias"])
+    return plan
+
+def filter_join_residuals(rows, residual_edges, schema):
+    if not residual_edges:
+        yield from rows
+        return
+    position_pairs = [
+        [schema_position(schema, f"{alias}.{field_name}") for alias, field_name in edge["fields"].items()]
+        for edge in residual_edges
+    ]
+    if any(position is None for pair in position_pairs for position in pair):
+        return
+    for row in rows:
+        try:
+            if all(
+                row[left] is not None and row[right] is not None and int(row[left]) == int(row[right])
+                for left, right in position_pairs
+            ):
+                yield row
+        except (ValueError, TypeError):
+            continue
+
+def reorder_row_columns(rows, schema, alias_order):
+    # SELECT * eseten az oszlopok a leirt tabla sorrendben maradnak
+    positions = [
+        position for alias in alias_order
+        for position, name in enumerate(schema) if name.startswith(alias + ".")
+    ]
+    pick = row_picker(positions)
+    return (pick(row) for row in rows), [schema[position] for position in positions]
+
+def execute_indexed_nested_loop_join(all_results, schema, join_clause, db_info, mongo_db, columns=None, inner_filter=None):
    
     print("ALGORITHM: Executing Indexed Nested Loop Join")
     join_table_name = join_clause["table"]
     join_table_alias = join_clause["alias"]
     on_condition = join_clause["on_condition"]
-    join_table_info = next((t for t in db_info["tables"] if t["name"] == join_table_name), None)
+    join_table_info = catalog.get_table(db_info["name"], join_table_name)
+    decode_row = get_row_decoder(db_info["name"], join_table_info, columns, as_tuple=True)
+    scan_projection = get_scan_projection(join_table_info, columns)
 
     left_part_on, right_part_on = on_condition["left"], on_condition["right"]
     alias1, field1 = left_part_on.split('.')
@@ -567,33 +2061,38 @@ def execute_indexed_nested_loop_join(all_results, join_clause, db_info, mongo_db
 
     inner_main_coll = mongo_db[join_table_name]
     is_inner_pk_join = (inner_field_name == join_table_info["attributes"][0]["name"])
+    inner_attr = next(attr for attr in join_table_info["attributes"] if attr["name"] == inner_field_name)
+    outer_position = schema_position(schema, f"{outer_alias}.{outer_field_name}")
+    inner_position = schema_position(decoded_column_names(join_table_info, columns), inner_field_name)
+    if outer_position is None or inner_position is None:
+        return
     
-    BATCH_SIZE = 1000
-    final_joined_results = []
-    
-    for i in range(0, len(all_results), BATCH_SIZE):
-        current_batch = all_results[i:i + BATCH_SIZE]
+    for current_batch in iterate_batches(all_results, JOIN_BATCH_SIZE):
         
         keys_to_lookup_int = set()
         for row in current_batch:
-            key_val = row.get(f"{outer_alias}.{outer_field_name}")
+            key_val = row[outer_position]
             if key_val is not None:
                 try: keys_to_lookup_int.add(int(key_val))
                 except (ValueError, TypeError): continue
         
         if not keys_to_lookup_int: continue
 
+        # a kulcsokat a belso mezo deklaralt tipusara alakitjuk (pl. int FK -> str PK)
+        inner_keys = [convert_attribute_value(inner_attr, k) for k in keys_to_lookup_int]
         inner_data_map = {}
         
         if is_inner_pk_join:
-            # ha PK-ra JOIN-olunk, a kulcsokat stringge kell alakitani a kereseshez
-            keys_for_db_query = [str(k) for k in keys_to_lookup_int]
-            inner_docs_cursor = inner_main_coll.find({"_id": {"$in": keys_for_db_query}})
+            # ha PK-ra JOIN-olunk, a kulcsokat a belso tabla _id kodolasara alakitjuk
+            keys_for_db_query = [encode_primary_key(join_table_info, k) for k in inner_keys]
+            inner_docs_cursor = inner_main_coll.find(
+                with_extra_filter({"_id": {"$in": keys_for_db_query}}, inner_filter), scan_projection
+            )
         else:
             # ha masodlagos indexre, akkor a sajat index kollekcionkat hasznaljuk
             inner_index_coll_name = f"{join_table_name}_{inner_field_name}_index"
             inner_index_coll = mongo_db[inner_index_coll_name]
-            index_entries = inner_index_coll.find({"key": {"$in": list(keys_to_lookup_int)}})
+            index_entries = inner_index_coll.find({"key": {"$in": inner_keys}})
             
             pks_to_find = []
             for entry in index_entries:
@@ -601,585 +2100,1245 @@ def execute_indexed_nested_loop_join(all_results, join_clause, db_info, mongo_db
                 else: pks_to_find.append(entry['value'])
             
             if not pks_to_find: continue
-            inner_docs_cursor = inner_main_coll.find({"_id": {"$in": pks_to_find}})
+            inner_docs_cursor = inner_main_coll.find(
+                with_extra_filter({"_id": {"$in": pks_to_find}}, inner_filter), scan_projection
+            )
 
         # a belso sorok feldolgozasa es a hash map epitese
         for inner_doc in inner_docs_cursor:
-            parsed_inner_obj = parse_value_string_to_dict(inner_doc["value"], join_table_info["attributes"])
-            parsed_inner_obj[join_table_info["attributes"][0]["name"]] = inner_doc["_id"]
+            inner_row = decode_row(inner_doc)
             
             # A hash map kulcsat mindig int-nek kezeljuk , legyen konzisztens
-            join_key_val = parsed_inner_obj.get(inner_field_name)
+            join_key_val = inner_row[inner_position]
             if join_key_val is not None:
                 try:
                     map_key = int(join_key_val)
                     if map_key not in inner_data_map: inner_data_map[map_key] = []
-                    inner_data_map[map_key].append(parsed_inner_obj)
+                    inner_data_map[map_key].append(inner_row)
                 except (ValueError, TypeError): continue
 
         # A batch sorainak osszekapcsolasa a hash mappel
         for outer_row in current_batch:
-            outer_join_value = outer_row.get(f"{outer_alias}.{outer_field_name}")
+            outer_join_value = outer_row[outer_position]
             if outer_join_value is None: continue
             try:
                 lookup_key = int(outer_join_value)
                 if lookup_key in inner_data_map:
                     for inner_row_data in inner_data_map[lookup_key]:
-                        joined_row = outer_row.copy()
-                        for k, v in inner_row_data.items():
-                            joined_row[f"{join_table_alias}.{k}"] = v
-                        final_joined_results.append(joined_row)
+                        yield outer_row + inner_row_data
             except (ValueError, TypeError): continue
-            
-    return final_joined_results
 
-def execute_hash_join(all_results, join_clause, db_info, mongo_db):
-    print("ALGORITHM: Executing Hash Join")
+def estimate_row_size(row):
+    size = sys.getsizeof(row)
+    if isinstance(row, dict):
+        for k, v in row.items():
+            size += sys.getsizeof(k) + sys.getsizeof(v)
+    elif isinstance(row, (tuple, list)):
+        for v in row:
+            size += estimate_row_size(v)
+    return size
+
+def keyed_rows(rows, key_position):
+    # a join kulcsot mindig int-kent kezeljuk, a hianyzo/hibas kulcsu sorok kiesnek
+    if key_position is None:
+        return
+    for row in rows:
+        key_value = row[key_position]
+        if key_value is None: continue
+        try: yield int(key_value), row
+        except (ValueError, TypeError): continue
+
+class SpillPartitions:
+    def __init__(self, partition_count, depth):
+        self.depth = depth
+        self.files = [tempfile.TemporaryFile(prefix="hashjoin-") for _ in range(partition_count)]
+
+    def add(self, key, row):
+        partition = hash((self.depth, key)) % len(self.files)
+        pickle.dump((key, row), self.files[partition], pickle.HIGHEST_PROTOCOL)
+
+    def read(self, partition):
+        spill_file = self.files[partition]
+        spill_file.seek(0)
+        while True:
+            try:
+                yield pickle.load(spill_file)
+            except EOFError:
+                return
+
+    def close(self):
+        for spill_file in self.files:
+            spill_file.close()
+
+def grace_hash_join(build_rows, probe_rows, combine, memory_budget=None, depth=0):
+    # build_rows, probe_rows: (kulcs, sor) parok; combine(build_sor, probe_sor) adja az osszekapcsolt sort
+    memory_budget = memory_budget or HASH_JOIN_MEMORY_BUDGET
+    hash_table = {}
+    build_iter = iter(build_rows)
+    sampled_size, row_count, over_budget = 0, 0, False
+    for key, row in build_iter:
+        hash_table.setdefault(key, []).append(row)
+        row_count += 1
+        if row_count <= ROW_SIZE_SAMPLE:
+            sampled_size += estimate_row_size(row)
+        if sampled_size / min(row_count, ROW_SIZE_SAMPLE) * row_count > memory_budget and depth < HASH_JOIN_MAX_DEPTH:
+            over_budget = True
+            break
+
+    if not over_budget:
+        if not hash_table:
+            return
+        for key, probe_row in probe_rows:
+            for build_row in hash_table.get(key, ()):
+                yield combine(build_row, probe_row)
+        return
+
+    # a build oldal nem fert el: mindket oldalt particionaljuk, es particionkent joinolunk
+    print(f"ALGORITHM: Hash join build side exceeded {memory_budget} bytes, spilling to {HASH_JOIN_PARTITIONS} partitions (level {depth + 1})")
+    build_partitions = SpillPartitions(HASH_JOIN_PARTITIONS, depth)
+    probe_partitions = SpillPartitions(HASH_JOIN_PARTITIONS, depth)
+    try:
+        for key, rows in hash_table.items():
+            for row in rows:
+                build_partitions.add(key, row)
+        hash_table = None
+        for key, row in build_iter:
+            build_partitions.add(key, row)
+        for key, row in probe_rows:
+            probe_partitions.add(key, row)
+
+        for partition in range(HASH_JOIN_PARTITIONS):
+            yield from grace_hash_join(
+                build_partitions.read(partition), probe_partitions.read(partition),
+                combine, memory_budget, depth + 1,
+            )
+    finally:
+        build_partitions.close()
+        probe_partitions.close()
+
+def execute_hash_join(all_results, schema, join_clause, db_info, mongo_db, columns=None, build_side="inner", inner_filter=None):
+    print(f"ALGORITHM: Executing Hash Join (build side: {build_side})")
     join_table_name = join_clause["table"]
     join_table_alias = join_clause["alias"]
     on_condition = join_clause["on_condition"]
-    join_table_info = next((t for t in db_info["tables"] if t["name"] == join_table_name), None)
+    join_table_info = catalog.get_table(db_info["name"], join_table_name)
+    decode_row = get_row_decoder(db_info["name"], join_table_info, columns, as_tuple=True)
+    scan_projection = get_scan_projection(join_table_info, columns)
 
     left_part_on, right_part_on = on_condition["left"], on_condition["right"]
     alias1, field1 = left_part_on.split('.')
     alias2, field2 = right_part_on.split('.')
 
     if alias1 == join_table_alias:
-        inner_alias, inner_field_name = alias1, field1
+        inner_field_name = field1
         outer_alias, outer_field_name = alias2, field2
     else:
-        inner_alias, inner_field_name = alias2, field2
+        inner_field_name = field2
         outer_alias, outer_field_name = alias1, field1
 
-    inner_data_map = {}
-    inner_collection = mongo_db[join_table_name]
-    for inner_doc in inner_collection.find({}):
-        _inner_id_string = inner_doc["_id"]
-        parsed_inner_value_obj = parse_value_string_to_dict(inner_doc["value"], join_table_info["attributes"])
-        parsed_inner_value_obj[join_table_info["attributes"][0]["name"]] = _inner_id_string
-        
-        join_key_value = parsed_inner_value_obj.get(inner_field_name)
-        if join_key_value is not None:
-            try:
-                map_key = int(join_key_value)
-                if map_key not in inner_data_map: inner_data_map[map_key] = []
-                inner_data_map[map_key].append(parsed_inner_value_obj)
-            except (ValueError, TypeError): continue
+    inner_rows = keyed_rows(
+        scan_rows(mongo_db[join_table_name].find(inner_filter or {}, scan_projection), decode_row),
+        schema_position(decoded_column_names(join_table_info, columns), inner_field_name),
+    )
+    outer_rows = keyed_rows(all_results, schema_position(schema, f"{outer_alias}.{outer_field_name}"))
 
-    new_all_results = []
-    for outer_row in all_results:
-        outer_join_value = outer_row.get(f"{outer_alias}.{outer_field_name}")
-        if outer_join_value is not None:
-            try:
-                lookup_key = int(outer_join_value)
-                if lookup_key in inner_data_map:
-                    for inner_row_data in inner_data_map[lookup_key]:
-                        joined_row = outer_row.copy()
-                        for k, v in inner_row_data.items():
-                            joined_row[f"{join_table_alias}.{k}"] = v
-                        new_all_results.append(joined_row)
-            except (ValueError, TypeError): continue
-    return new_all_results
+    if build_side == "outer":
+        # a kulso oldal a kisebb: azt toltjuk a hash tablaba, a belso tablat csak vegigolvassuk
+        return grace_hash_join(outer_rows, inner_rows, operator.add)
+    return grace_hash_join(inner_rows, outer_rows, lambda inner_row_data, outer_row: outer_row + inner_row_data)
 
 
-def select_from_table(tokens):
+def write_sorted_run(items):
+    run_file = tempfile.TemporaryFile(prefix="sortrun-")
+    for item in items:
+        pickle.dump(item, run_file, pickle.HIGHEST_PROTOCOL)
+    run_file.seek(0)
+    return run_file
+
+def read_sorted_run(run_file):
+    while True:
+        try:
+            yield pickle.load(run_file)
+        except EOFError:
+            return
+
+class SortedRuns:
+    # rendezett futamok keletkezesi sorrendben, (szint, fajl) parokkent. Ha az utolso
+    # MERGE_FAN_IN futam azonos szintu, egy eggyel magasabb szintu futamma fesuljuk oket,
+    # igy egyszerre csak nehany tucat fajl van nyitva. A heapq.merge egyenlo kulcsnal az
+    # elobbi futamot veszi elore, a szomszedos futamok osszefesulese tehat stabil marad
+    def __init__(self, key, fan_in=None):
+        self.key = key
+        self.fan_in = fan_in or MERGE_FAN_IN
+        self.runs = []
+        self.run_count = 0
+
+    def __len__(self):
+        return len(self.runs)
+
+    def add(self, items):
+        self.runs.append((0, write_sorted_run(items)))
+        self.run_count += 1
+        while len(self.runs) >= self.fan_in and self.runs[-self.fan_in][0] == self.runs[-1][0]:
+            level = self.runs[-1][0]
+            merged_file = self.merge_group(self.runs[-self.fan_in:])
+            del self.runs[-self.fan_in:]
+            self.runs.append((level + 1, merged_file))
+
+    def merge_group(self, runs):
+        try:
+            return write_sorted_run(heapq.merge(*[read_sorted_run(run_file) for _, run_file in runs], key=self.key))
+        finally:
+            for _, run_file in runs:
+                run_file.close()
+
+    def merge(self, *extra):
+        # a vegso osszefesules is legfeljebb fan_in bemenetet kap, a memoriaban maradt sorokkal egyutt
+        while len(self.runs) + len(extra) > self.fan_in:
+            merged_runs = []
+            while self.runs:
+                group = self.runs[:self.fan_in]
+                merged_runs.append((0, self.merge_group(group)))
+                del self.runs[:len(group)]
+            self.runs = merged_runs
+        return heapq.merge(*[read_sorted_run(run_file) for _, run_file in self.runs], *extra, key=self.key)
+
+    def close(self):
+        for _, run_file in self.runs:
+            run_file.close()
+
+def external_sort(items, key, memory_budget=None):
+    # memoriaban rendezett futamok, a keret felett fajlba irva, a vegen k-utas osszefesules
+    memory_budget = memory_budget or SORT_MEMORY_BUDGET
+    sorted_runs = SortedRuns(key)
+    buffer = []
+    sampled_size = 0
+    try:
+        for item in items:
+            buffer.append(item)
+            if len(buffer) <= ROW_SIZE_SAMPLE:
+                sampled_size += estimate_row_size(item)
+            if sampled_size / min(len(buffer), ROW_SIZE_SAMPLE) * len(buffer) > memory_budget:
+                buffer.sort(key=key)
+                sorted_runs.add(buffer)
+                buffer, sampled_size = [], 0
+        buffer.sort(key=key)
+
+        if not sorted_runs:
+            yield from buffer
+            return
+
+        print(f"ALGORITHM: External sort spilled {sorted_runs.run_count} sorted runs to disk")
+        yield from sorted_runs.merge(buffer)
+    finally:
+        sorted_runs.close()
+
+def join_key_of(item):
+    return item[0]
+
+def merge_join(outer_rows, inner_rows, combine):
+    # mindket bemenet (kulcs, sor) parok novekvo kulcs szerint
+    inner_iter = iter(inner_rows)
+    inner_item = next(inner_iter, None)
+    group_key, group = None, []
+    for key, outer_row in outer_rows:
+        if key != group_key:
+            if inner_item is None and not group:
+                return
+            while inner_item is not None and inner_item[0] < key:
+                inner_item = next(inner_iter, None)
+            group_key, group = key, []
+            while inner_item is not None and inner_item[0] == key:
+                group.append(inner_item[1])
+                inner_item = next(inner_iter, None)
+        for inner_row_data in group:
+            yield combine(outer_row, inner_row_data)
+
+def execute_sort_merge_join(all_results, schema, join_clause, db_info, mongo_db, columns=None, inner_filter=None, outer_sorted=False):
+    join_table_name = join_clause["table"]
+    join_table_alias = join_clause["alias"]
+    on_condition = join_clause["on_condition"]
+    join_table_info = catalog.get_table(db_info["name"], join_table_name)
+    decode_row = get_row_decoder(db_info["name"], join_table_info, columns, as_tuple=True)
+    scan_projection = get_scan_projection(join_table_info, columns)
+
+    alias1, field1 = on_condition["left"].split('.')
+    alias2, field2 = on_condition["right"].split('.')
+    if alias1 == join_table_alias:
+        inner_field_name = field1
+        outer_alias, outer_field_name = alias2, field2
+    else:
+        inner_field_name = field2
+        outer_alias, outer_field_name = alias1, field1
+
+    inner_sorted = (
+        inner_field_name == join_table_info["attributes"][0]["name"]
+        and has_ordered_key_scan({"table_info": join_table_info})
+    )
+    print(f"ALGORITHM: Executing Sort-Merge Join (outer {'presorted' if outer_sorted else 'sorted'}, inner {'presorted' if inner_sorted else 'sorted'})")
+
+    inner_cursor = mongo_db[join_table_name].find(inner_filter or {}, scan_projection)
+    if inner_sorted:
+        inner_cursor = inner_cursor.sort("_id", 1)
+    inner_rows = keyed_rows(
+        scan_rows(inner_cursor, decode_row), schema_position(decoded_column_names(join_table_info, columns), inner_field_name)
+    )
+    outer_rows = keyed_rows(all_results, schema_position(schema, f"{outer_alias}.{outer_field_name}"))
+    if not inner_sorted:
+        inner_rows = external_sort(inner_rows, join_key_of)
+    if not outer_sorted:
+        outer_rows = external_sort(outer_rows, join_key_of)
+    return merge_join(outer_rows, inner_rows, operator.add)
+
+
+def select_from_table(tokens, session):
     parsed_statement = parse_select_statement(tokens)
     if "error" in parsed_statement: return parsed_statement["error"]
+    # a kulcs a whitespace-re normalizalt lekerdezes es az aktualis adatbazis
+    return cached_select(session, (session.current_db, " ".join(tokens)), parsed_statement)
+
+def cached_select(session, cache_key, parsed_statement, plan_key=None):
+    if session.current_db is None:
+        return execute_select(parsed_statement, session)
+
+    cached_chunks = result_cache.get(cache_key)
+    if cached_chunks is not None:
+        print("CACHE: Result cache hit.")
+        return iter(cached_chunks)
+
+    table_names = [parsed_statement["from_table"]] + [join_clause["table"] for join_clause in parsed_statement["joins"]]
+    versions = result_cache.table_versions(session.current_db, table_names)
+    result = execute_select(parsed_statement, session, plan_key)
+    if isinstance(result, str):
+        return result
+    return result_cache.collect(cache_key, versions, result)
+
+def execute_select(parsed_statement, session, plan_key=None):
+    # plan_key eseten (EXECUTE) a mar elkeszult tervet hasznaljuk, amig a katalogus es az indexek nem valtoznak
+    version = plan_cache_version()
+    plan = plan_cache.get(plan_key, version) if plan_key is not None else None
+    if plan is not None:
+        print("OPTIMIZER: Reusing cached plan.")
+        where_conditions, error = resolve_where_conditions(parsed_statement)
+        if error: return error
+        return run_select_plan(plan, parsed_statement, session, where_conditions)
+
+    plan, error = plan_select(parsed_statement, session)
+    if error: return error
+    if plan_key is not None:
+        plan_cache.put(plan_key, version, plan)
+    return run_select_plan(plan, parsed_statement, session, plan["where_conditions"])
+
+def resolve_where_conditions(parsed_statement):
+    where_conditions = []
+    for cond_str in parsed_statement["where_conditions"]:
+        parsed_cond = parse_condition(cond_str)
+        if not parsed_cond: return None, f"Syntax error in WHERE condition: {cond_str}"
+        full_field_spec, op, value = parsed_cond
+        field_alias, field_name = (full_field_spec.split(".", 1) if "." in full_field_spec else (parsed_statement["from_alias"], full_field_spec))
+        where_conditions.append({"field_alias": field_alias, "field_name": field_name, "op": op, "value": value})
+    return where_conditions, None
 
-    columns_to_project = parsed_statement["columns"]
-    aggregate_functions = parsed_statement["aggregate_functions"]
+def plan_select(parsed_statement, session):
+    mongo_db = session.mongo_db
     from_table_name = parsed_statement["from_table"]
     from_table_alias = parsed_statement["from_alias"]
     joins = parsed_statement["joins"]
-    where_conditions_raw = parsed_statement["where_conditions"]
-    group_by_columns = parsed_statement["group_by_columns"]
-    order_by_columns = parsed_statement["order_by_columns"]
 
-    if mongo_db is None: return "Error: No database selected"
-    catalog = load_catalog()
-    db_info = get_current_database(catalog)
-    if not db_info: return "Error: Database not found in catalog"
-    main_table_info = next((t for t in db_info["tables"] if t["name"] == from_table_name), None)
-    if not main_table_info: return f"Error: Table '{from_table_name}' does not exist."
+    if mongo_db is None: return None, "Error: No database selected"
+    db_info = get_current_database(session)
+    if not db_info: return None, "Error: Database not found in catalog"
+    main_table_info = catalog.get_table(db_info["name"], from_table_name)
+    if not main_table_info: return None, f"Error: Table '{from_table_name}' does not exist."
 
-    mongo_initial_filter = {}
-    python_side_where_conditions = []
-    for cond_str in where_conditions_raw:
-        parsed_cond = parse_condition(cond_str)
-        if not parsed_cond: return f"Syntax error in WHERE condition: {cond_str}"
-        full_field_spec, op, value = parsed_cond
-        field_alias, field_name = (full_field_spec.split(".", 1) if "." in full_field_spec else (from_table_alias, full_field_spec))
-        if (field_alias == from_table_alias and field_name == main_table_info["attributes"][0]["name"]):
-            if op == "=": mongo_initial_filter["_id"] = str(value)
-            elif op == ">": mongo_initial_filter["_id"] = {"$gt": str(value)}
-            elif op == "<": mongo_initial_filter["_id"] = {"$lt": str(value)}
-            elif op == ">=": mongo_initial_filter["_id"] = {"$gte": str(value)}
-            elif op == "<=": mongo_initial_filter["_id"] = {"$lte": str(value)}
-        else:
-            python_side_where_conditions.append({"field_alias": field_alias, "field_name": field_name, "op": op, "value": value})
-
-    all_results = []
-    for doc in mongo_db[from_table_name].find(mongo_initial_filter):
-        _id_string = doc["_id"]
-        parsed_value_obj = parse_value_string_to_dict(doc["value"], main_table_info["attributes"])
-        parsed_value_obj[main_table_info["attributes"][0]["name"]] = _id_string
-        row = {}
-        for k, v in parsed_value_obj.items():
-            row[f"{from_table_alias}.{k}"] = v
-        all_results.append(row)
-
-    # query optimizer
+    where_conditions, error = resolve_where_conditions(parsed_statement)
+    if error: return None, error
+
+    # base tablak, mindegyik a sajat WHERE felteteleivel (predicate pushdown)
+    table_refs = [(from_table_alias, main_table_info)]
     for join_clause in joins:
-        join_table_name = join_clause["table"]
-        on_condition = join_clause["on_condition"]
-        
-        left_part_on, right_part_on = on_condition["left"], on_condition["right"]
-        alias1, field1 = left_part_on.split('.')
-        alias2, field2 = right_part_on.split('.')
-        inner_field_name = field1 if alias1 == join_clause["alias"] else field2
-        
-        inner_table_info = next((t for t in db_info["tables"] if t["name"] == join_table_name), None)
-        is_pk_join = (inner_field_name == inner_table_info["attributes"][0]["name"])
-        
-        inner_index_coll_name = f"{join_table_name}_{inner_field_name}_index"
-        has_secondary_index = inner_index_coll_name in mongo_db.list_collection_names()
+        join_table_info = catalog.get_table(db_info["name"], join_clause["table"])
+        if join_table_info is None: return None, f"Error: Table '{join_clause['table']}' does not exist."
+        table_refs.append((join_clause["alias"], join_table_info))
+
+    relations = [
+        prepare_relation(
+            mongo_db, db_info, parsed_statement, table_info, alias,
+            [cond for cond in where_conditions if cond["field_alias"] == alias],
+        )
+        for alias, table_info in table_refs
+    ]
+    relations_by_alias = {relation["alias"]: relation for relation in relations}
+
+    # query optimizer: join sorrend es algoritmus koltsegbecsles alapjan
+    first_relation, join_steps, join_order = relations[0], [], None
+    if joins:
+        edges, error = parse_join_edges(joins, relations_by_alias)
+        if error: return None, error
+        join_order = choose_join_order(mongo_db, relations, edges)
+        if join_order is None: return None, "Error: JOIN conditions do not connect all tables."
+        first_relation, join_steps = join_order["first_relation"], join_order["steps"]
+        order_description = " -> ".join([first_relation["alias"]] + [step["relation"]["alias"] for step in join_steps])
+        print(f"OPTIMIZER: Join order {order_description} (estimated cost {join_order['cost']:.0f}).")
+
+    key_order_scan = None
+    if parsed_statement["order_by_columns"]:
+        key_order_scan = choose_key_order_scan(mongo_db, parsed_statement, relations, first_relation, join_order)
+
+    # a terv a WHERE ertekek nelkul is ujrafuttathato: a relaciok a decoderrel es a sor schemaval,
+    # a join sorrend es algoritmusok, es az ORDER BY-t kivalto olvasasi sorrend
+    return {
+        "db_info": db_info,
+        "relations": relations,
+        "first_alias": first_relation["alias"],
+        "join_steps": join_steps,
+        "key_order_scan": key_order_scan,
+        "where_conditions": where_conditions,
+    }, None
+
+def bind_plan(plan, where_conditions):
+    # a terv relacioi es join lepesei az aktualis WHERE feltetelekkel
+    relations_by_alias = {
+        relation["alias"]: dict(relation, conditions=[cond for cond in where_conditions if cond["field_alias"] == relation["alias"]])
+        for relation in plan["relations"]
+    }
+    # ismeretlen aliasra vonatkozo feltetel a vegen szurodik (es minden sort kiszur)
+    python_side_where_conditions = [cond for cond in where_conditions if cond["field_alias"] not in relations_by_alias]
+    first_relation = relations_by_alias[plan["first_alias"]]
+    join_steps = [dict(step, relation=relations_by_alias[step["relation"]["alias"]]) for step in plan["join_steps"]]
+    return first_relation, join_steps, python_side_where_conditions
+
+def uses_columnar_plan(session, parsed_statement, first_relation, join_steps, python_side_where_conditions):
+    # egytablas aggregalo lekerdezes: oszloposan, NumPy batchekben is futtathato
+    return not join_steps and (parsed_statement["group_by_columns"] or parsed_statement["aggregate_functions"]) \
+        and not python_side_where_conditions and use_columnar_execution(session, first_relation)
+
+def open_first_relation(mongo_db, first_relation, key_order_scan, join_steps):
+    # ha egy merge join vagy az ORDER BY a kezdo tabla _id sorrendjere epit, rendezve olvassuk
+    if key_order_scan and key_order_scan["kind"] == "index":
+        return scan_relation_in_index_order(
+            mongo_db, first_relation, key_order_scan["field_name"], key_order_scan["direction"]
+        )
+    if key_order_scan and key_order_scan["kind"] == "key" or any(step["uses_scan_order"] for step in join_steps):
+        if key_order_scan:
+            print(f"OPTIMIZER: Streaming {first_relation['table']} in primary key order for ORDER BY.")
+        return scan_relation(mongo_db, first_relation, key_order_scan["direction"] if key_order_scan else 1)
+    return scan_relation(mongo_db, first_relation)
+
+def execute_join_step(mongo_db, db_info, all_results, schema, step, inner_filter):
+    relation = step["relation"]
+    join_table_name = relation["table"]
+    inner_field_name = step["inner_field_name"]
+    join_clause = {
+        "table": join_table_name,
+        "alias": relation["alias"],
+        "on_condition": {
+            "left": f"{step['outer_alias']}.{step['outer_field_name']}",
+            "right": f"{relation['alias']}.{inner_field_name}",
+        },
+    }
+    costs = ", ".join(f"{name}={cost:.0f}" for name, cost in step["costs"].items())
 
-        if is_pk_join or has_secondary_index:
-            print(f"OPTIMIZER: Index found on {join_table_name}.{inner_field_name}. Using Indexed Nested Loop Join.")
-            all_results = execute_indexed_nested_loop_join(all_results, join_clause, db_info, mongo_db)
-        else:
-            print(f"OPTIMIZER: No index found on {join_table_name}.{inner_field_name}. Falling back to Hash Join.")
-            all_results = execute_hash_join(all_results, join_clause, db_info, mongo_db)
+    if step["algorithm"] == "inlj":
+        print(f"OPTIMIZER: Index on {join_table_name}.{inner_field_name}, ~{step['outer_rows']:.0f} outer rows ({costs}). Using Indexed Nested Loop Join.")
+        return execute_indexed_nested_loop_join(
+            all_results, schema, join_clause, db_info, mongo_db, relation["columns"], inner_filter
+        )
+    if step["algorithm"] == "merge":
+        print(f"OPTIMIZER: Join on {join_table_name}.{inner_field_name}, ~{step['outer_rows']:.0f} outer rows ({costs}). Using Sort-Merge Join.")
+        return execute_sort_merge_join(
+            all_results, schema, join_clause, db_info, mongo_db, relation["columns"], inner_filter, step["outer_sorted"]
+        )
+    print(f"OPTIMIZER: Join on {join_table_name}.{inner_field_name}, ~{step['outer_rows']:.0f} outer rows ({costs}). Using Hash Join.")
+    return execute_hash_join(
+        all_results, schema, join_clause, db_info, mongo_db, relation["columns"], step["build_side"], inner_filter
+    )
+
+def run_select_plan(plan, parsed_statement, session, where_conditions, profile=None):
+    mongo_db = session.mongo_db
+    db_info = plan["db_info"]
+    columns_to_project = parsed_statement["columns"]
+    aggregate_functions = parsed_statement["aggregate_functions"]
+    group_by_columns = parsed_statement["group_by_columns"]
+    key_order_scan = plan["key_order_scan"]
+    first_relation, join_steps, python_side_where_conditions = bind_plan(plan, where_conditions)
+
+    if uses_columnar_plan(session, parsed_statement, first_relation, join_steps, python_side_where_conditions):
+        aggregated = trace_call(profile, ("aggregate",), columnar_aggregate, mongo_db, first_relation, parsed_statement)
+        if aggregated is not None:
+            aggregated_rows, aggregated_schema = aggregated
+            aggregated_rows = trace_rows(profile, ("aggregate",), aggregated_rows)
+            return order_and_project_rows(aggregated_rows, aggregated_schema, parsed_statement, profile=profile)
+
+    # (a profil kulcsai egyeznek az EXPLAIN fa csomopontjainak kulcsaival)
+    scan_key = ("scan", first_relation["alias"])
+    all_results = trace_rows(profile, scan_key, trace_call(
+        profile, scan_key, open_first_relation, mongo_db, first_relation, key_order_scan, join_steps
+    ))
+    # a sorok tuple-ok, a schema adja meg, melyik pozicion melyik "alias.mezo" all
+    schema = list(first_relation["schema"])
+
+    for step in join_steps:
+        relation = step["relation"]
+        inner_filter, inner_python_conditions = split_relation_conditions(relation["table_info"], relation["conditions"])
+        join_key = ("join", relation["alias"])
+        all_results = trace_rows(profile, join_key, trace_call(
+            profile, join_key, execute_join_step, mongo_db, db_info, all_results, schema, step, inner_filter
+        ))
+        schema = schema + relation["schema"]
+        all_results = filter_rows(
+            filter_join_residuals(all_results, step["residual_edges"], schema), inner_python_conditions, schema
+        )
+        if step["residual_edges"] or inner_python_conditions:
+            all_results = trace_rows(profile, ("filter", relation["alias"]), all_results)
+
+    execution_order = [first_relation["alias"]] + [step["relation"]["alias"] for step in join_steps]
+    written_order = [relation["alias"] for relation in plan["relations"]]
+    if columns_to_project == ["*"] and execution_order != written_order:
+        all_results, schema = reorder_row_columns(all_results, schema, written_order)
     
     # WHERE szures
-    final_results_after_where = []
-    if not python_side_where_conditions:
-        final_results_after_where = all_results
+    final_results_after_where = filter_rows(all_results, python_side_where_conditions, schema)
+    if python_side_where_conditions:
+        final_results_after_where = trace_rows(profile, ("filter", None), final_results_after_where)
+
+    # GROUP BY / aggregacio egyetlen menetben, csoportonkent aggregatum-allapotokkal
+    if group_by_columns or aggregate_functions:
+        final_results_for_ordering, schema = trace_call(
+            profile, ("aggregate",), hash_aggregate, final_results_after_where, schema, group_by_columns, aggregate_functions
+        )
+        final_results_for_ordering = trace_rows(profile, ("aggregate",), final_results_for_ordering)
     else:
-        for row in all_results:
-            all_conditions_met = True
-            for cond in python_side_where_conditions:
-                field_alias, field_name, op, target_value = cond["field_alias"], cond["field_name"], cond["op"], cond["value"]
-                current_value = row.get(f"{field_alias}.{field_name}")
-                if current_value is None: all_conditions_met = False; break
-                try:
-                    if isinstance(target_value, int): current_value = int(current_value)
-                    elif isinstance(target_value, float): current_value = float(current_value)
-                    elif isinstance(target_value, str): current_value = str(current_value)
-                except (ValueError, TypeError): all_conditions_met = False; break
-                
-                if op == "=": is_met = (current_value == target_value)
-                elif op == "<": is_met = (current_value < target_value)
-                elif op == ">": is_met = (current_value > target_value)
-                elif op == "<=": is_met = (current_value <= target_value)
-                elif op == ">=": is_met = (current_value >= target_value)
-                else: is_met = False
-                if not is_met: all_conditions_met = False; break
-            if all_conditions_met:
-                final_results_after_where.append(row)
-
-    # GROUP BY aggregacio
-    if group_by_columns:
-        grouped_results = {}
-
-        for row in final_results_after_where:
-            group_key_values = []
-            for group_col_spec_from_query in group_by_columns:
-                actual_key_in_row = group_col_spec_from_query
-                if "." not in group_col_spec_from_query:
-                    found_key_for_grouping = False
-                    for k_in_row in row.keys():
-                        if k_in_row.endswith(
-                            f".{group_col_spec_from_query}"
-                        ):
-                            actual_key_in_row = k_in_row
-                            found_key_for_grouping = True
-                            break
-                    if not found_key_for_grouping:
-                        if (
-                            group_col_spec_from_query
-                            == main_table_info["attributes"][0]["name"]
-                        ):
-                            actual_key_in_row = f"{from_table_alias}.{group_col_spec_from_query}"
-
-                value_for_group_key = row.get(actual_key_in_row)
-                group_key_values.append(value_for_group_key)
-
-            group_key = tuple(group_key_values)
-
-            if group_key not in grouped_results:
-                grouped_results[group_key] = []
-            grouped_results[group_key].append(row)
-
-        aggregated_output_rows = []
-        for group_key, rows_in_group in grouped_results.items():
-            aggregated_row = {}
-            if group_by_columns:
-                for i, group_col_spec_from_query in enumerate(
-                    group_by_columns
-                ):
-                    col_name_for_output = group_col_spec_from_query
-                    if "." in group_col_spec_from_query:
-                        _, col_name_for_output = group_col_spec_from_query.split(
-                            ".", 1
-                        )
-
-                    aggregated_row[col_name_for_output] = group_key[i]
-
-            for agg_func_info in aggregate_functions:
-                func_name = agg_func_info["func"]
-                field_spec_for_agg = agg_func_info["field"]
-
-                values_for_aggregation = []
-                if field_spec_for_agg == "*":
-                    values_for_aggregation = rows_in_group
-                else:
-                    for r_in_group in rows_in_group:
-                        actual_key_for_agg_in_row = field_spec_for_agg
-                        if "." not in field_spec_for_agg:
-                            found_key_for_agg = False
-                            for k_in_row_agg in r_in_group.keys():
-                                if k_in_row_agg.endswith(
-                                    f".{field_spec_for_agg}"
-                                ):
-                                    actual_key_for_agg_in_row = k_in_row_agg
-                                    found_key_for_agg = True
-                                    break
-                            if (
-                                not found_key_for_agg
-                                and field_spec_for_agg
-                                == main_table_info["attributes"][0]["name"]
-                            ):
-                                actual_key_for_agg_in_row = f"{from_table_alias}.{field_spec_for_agg}"
-
-                        val = r_in_group.get(actual_key_for_agg_in_row)
-                        if val is not None:
-                            try:
-                                if func_name in ["MIN", "MAX", "SUM", "AVG"]:
-                                    if isinstance(val, str):
-                                        if "." in val:
-                                            values_for_aggregation.append(
-                                                float(val)
-                                            )
-                                        else:
-                                            values_for_aggregation.append(
-                                                int(val)
-                                            )
-                                    elif isinstance(val, (int, float)):
-                                        values_for_aggregation.append(val)
-                                else:
-                                    values_for_aggregation.append(val)
-                            except ValueError:
-                                pass
-
-                agg_result = None
-                if func_name == "COUNT":
-                    agg_result = len(values_for_aggregation)
-                elif func_name == "SUM":
-                    numeric_values_for_sum = [
-                        v
-                        for v in values_for_aggregation
-                        if isinstance(v, (int, float))
-                    ]
-                    agg_result = (
-                        sum(numeric_values_for_sum)
-                        if numeric_values_for_sum
-                        else 0
-                    )
-                elif func_name == "AVG":
-                    numeric_values_for_avg = [
-                        v
-                        for v in values_for_aggregation
-                        if isinstance(v, (int, float))
-                    ]
-                    agg_result = (
-                        sum(numeric_values_for_avg)
-                        / len(numeric_values_for_avg)
-                        if numeric_values_for_avg
-                        else None
-                    )
-                elif func_name == "MIN":
-                    comparable_values_for_min = [
-                        v
-                        for v in values_for_aggregation
-                        if isinstance(v, (int, float, str))
-                    ]
-                    agg_result = (
-                        min(comparable_values_for_min)
-                        if comparable_values_for_min
-                        else None
-                    )
-                elif func_name == "MAX":
-                    comparable_values_for_max = [
-                        v
-                        for v in values_for_aggregation
-                        if isinstance(v, (int, float, str))
-                    ]
-                    agg_result = (
-                        max(comparable_values_for_max)
-                        if comparable_values_for_max
-                        else None
-                    )
+        final_results_for_ordering = final_results_after_where
 
-                agg_column_name = f"{func_name}({field_spec_for_agg})"
-                aggregated_row[agg_column_name] = agg_result
+    return order_and_project_rows(final_results_for_ordering, schema, parsed_statement, key_order_scan, profile)
 
-            aggregated_output_rows.append(aggregated_row)
+def order_and_project_rows(final_results_for_ordering, schema, parsed_statement, key_order_scan=None, profile=None):
+    columns_to_project = parsed_statement["columns"]
+    order_by_columns = parsed_statement["order_by_columns"]
+    limit, offset = parsed_statement["limit"], parsed_statement["offset"]
+
+    distinct = parsed_statement["distinct"]
+    output_names, project_values = compile_projection(columns_to_project, schema)
+
+    # ORDER BY rendezes (ha a sorok mar kulcs sorrendben jonnek, nincs mit rendezni)
+    top_k_output = None
+    if order_by_columns and not key_order_scan:
+        sort_key = order_by_sort_key(order_by_columns, schema)
+        if limit is not None:
+            # LIMIT eseten eleg a legelso offset + limit sor egy korlatos kupacban
+            print(f"OPTIMIZER: Using top-{offset + limit} heap for ORDER BY ... LIMIT.")
+            top_k_output = trace_call(
+                profile, ("sort",), top_k_rows,
+                ((sort_key(row_data), project_values(row_data)) for row_data in final_results_for_ordering),
+                offset + limit,
+                distinct=distinct,
+            )
+        else:
+            # a memoriakeret felett rendezett futamokat irunk ki es osszefesuljuk
+            final_results_for_ordering = trace_rows(
+                profile, ("sort",), external_sort(final_results_for_ordering, key=sort_key)
+            )
+
+    # PROJECTION (es DISTINCT a kimeneti ertekekre)
+    if top_k_output is not None:
+        output_values = trace_rows(profile, ("sort",), iter(top_k_output))
+    else:
+        output_values = trace_rows(
+            profile, ("project",), (project_values(row_data) for row_data in final_results_for_ordering)
+        )
+        if distinct:
+            output_values = trace_rows(profile, ("distinct",), distinct_rows(output_values))
 
-        final_results_for_ordering = aggregated_output_rows
-    elif aggregate_functions:
-        aggregated_row = {}
-        for agg_func_info in aggregate_functions:
-            func_name = agg_func_info["func"]
-            field_spec_for_agg = agg_func_info["field"]
+    # LIMIT/OFFSET: az islice leallitja a teljes pipeline-t, amint eleg sor van
+    if limit is not None or offset:
+        output_values = trace_rows(
+            profile, ("limit",), itertools.islice(output_values, offset, None if limit is None else offset + limit)
+        )
 
-            values_for_aggregation = []
-            if field_spec_for_agg == "*":
-                values_for_aggregation = final_results_after_where
-            else:
-                for r_in_group in final_results_after_where:
-                    actual_key_for_agg_in_row = field_spec_for_agg
-                    if "." not in field_spec_for_agg:
-                        found_key_for_agg = False
-                        for k_in_row_agg in r_in_group.keys():
-                            if k_in_row_agg.endswith(
-                                f".{field_spec_for_agg}"
-                            ):
-                                actual_key_for_agg_in_row = k_in_row_agg
-                                found_key_for_agg = True
-                                break
-                        if (
-                            not found_key_for_agg
-                            and field_spec_for_agg
-                            == main_table_info["attributes"][0]["name"]
-                        ):
-                            actual_key_for_agg_in_row = f"{from_table_alias}.{field_spec_for_agg}"
-
-                    val = r_in_group.get(actual_key_for_agg_in_row)
-                    if val is not None:
-                        try:
-                            if func_name in ["MIN", "MAX", "SUM", "AVG"]:
-                                if isinstance(val, str):
-                                    if "." in val:
-                                        values_for_aggregation.append(
-                                            float(val)
-                                        )
-                                    else:
-                                        values_for_aggregation.append(
-                                            int(val)
-                                        )
-                                elif isinstance(val, (int, float)):
-                                    values_for_aggregation.append(val)
-                            else:
-                                values_for_aggregation.append(val)
-                        except ValueError:
-                            pass
-
-            agg_result = None
-            if func_name == "COUNT":
-                agg_result = len(values_for_aggregation)
-            elif func_name == "SUM":
-                numeric_values_for_sum = [
-                    v
-                    for v in values_for_aggregation
-                    if isinstance(v, (int, float))
-                ]
-                agg_result = (
-                    sum(numeric_values_for_sum)
-                    if numeric_values_for_sum
-                    else 0
-                )
-            elif func_name == "AVG":
-                numeric_values_for_avg = [
-                    v
-                    for v in values_for_aggregation
-                    if isinstance(v, (int, float))
-                ]
-                agg_result = (
-                    sum(numeric_values_for_avg) / len(numeric_values_for_avg)
-                    if numeric_values_for_avg
-                    else None
-                )
-            elif func_name == "MIN":
-                comparable_values_for_min = [
-                    v
-                    for v in values_for_aggregation
-                    if isinstance(v, (int, float, str))
-                ]
-                agg_result = (
-                    min(comparable_values_for_min)
-                    if comparable_values_for_min
-                    else None
-                )
-            elif func_name == "MAX":
-                comparable_values_for_max = [
-                    v
-                    for v in values_for_aggregation
-                    if isinstance(v, (int, float, str))
-                ]
-                agg_result = (
-                    max(comparable_values_for_max)
-                    if comparable_values_for_max
-                    else None
-                )
+    return stream_json_array(dict(zip(output_names, values)) for values in output_values)
+
+explain_analyze_lock = threading.Lock()
 
-            agg_column_name = f"{func_name}({field_spec_for_agg})"
-            aggregated_row[agg_column_name] = agg_result
+def explain_select(tokens, session):
+    analyze = len(tokens) > 1 and tokens[1].upper() == "ANALYZE"
+    select_tokens = tokens[2:] if analyze else tokens[1:]
+    if not select_tokens or select_tokens[0].upper() != "SELECT":
+        return "Syntax error in EXPLAIN. Usage: EXPLAIN [ANALYZE] SELECT ..."
+    parsed_statement = parse_select_statement(select_tokens)
+    if "error" in parsed_statement: return parsed_statement["error"]
 
-        final_results_for_ordering = [aggregated_row]
+    # az EXPLAIN mindig uj tervet keszit, es nem hasznalja a result cache-t
+    if not analyze:
+        plan, error = plan_select(parsed_statement, session)
+        if error: return error
+        return format_explain_tree(explain_plan(plan, parsed_statement, session))
+
+    # a tracemalloc az egesz processzre vonatkozik: egyszerre csak egy ANALYZE merhet,
+    # es a tobbi session foglalasai is beleszamitanak
+    with explain_analyze_lock:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            profile = QueryProfile()
+            round_trip_counter.local.profile = profile
+            planning_started = time.perf_counter()
+            plan, error = plan_select(parsed_statement, session)
+            if error: return error
+            planning_time = time.perf_counter() - planning_started
+            planning_round_trips = profile.round_trips
+
+            execution_started = time.perf_counter()
+            result = run_select_plan(plan, parsed_statement, session, plan["where_conditions"], profile)
+            for _ in result:
+                pass
+            execution_time = time.perf_counter() - execution_started
+        finally:
+            round_trip_counter.local.profile = None
+            if started_tracing:
+                tracemalloc.stop()
+
+    lines = [
+        f"Planning: {planning_time * 1000:.1f} ms, {planning_round_trips} round trip(s)",
+        f"Execution: {execution_time * 1000:.1f} ms, {profile.round_trips - planning_round_trips} round trip(s), "
+        f"peak memory {format_bytes(profile.peak_memory)} (process-wide)",
+        "Operator times, round trips and memory include the operators below them.",
+        "Memory is traced for the whole server process, other sessions' allocations included.",
+        "",
+    ]
+    return "\n".join(lines) + format_explain_tree(explain_plan(plan, parsed_statement, session), profile)
+
+def format_condition(cond):
+    return f"{cond['field_alias']}.{cond['field_name']} {cond['op']} {json.dumps(cond['value'])}"
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def explain_node(key, label, details=(), children=()):
+    return {"key": key, "label": label, "details": [detail for detail in details if detail], "children": list(children)}
+
+def describe_filters(table_info, conditions, python_side=True):
+    # a join belso oldalan a Python oldali feltetelek a join utani Filter operatorba kerulnek
+    _, python_side_conditions = split_relation_conditions(table_info, conditions)
+    pushed = [cond for cond in conditions if not any(cond is c for c in python_side_conditions)]
+    return [
+        "MongoDB filter: " + " AND ".join(map(format_condition, pushed)) if pushed else None,
+        "Python filter: " + " AND ".join(map(format_condition, python_side_conditions))
+        if python_side and python_side_conditions else None,
+    ]
+
+def describe_columns(relation):
+    return "columns: " + ("*" if relation["columns"] is None else ", ".join(relation["schema"]))
+
+def relation_label(kind, relation):
+    if relation["alias"] == relation["table"]:
+        return f"{kind} on {relation['table']}"
+    return f"{kind} on {relation['table']} {relation['alias']}"
+
+def explain_first_relation(mongo_db, relation, key_order_scan, join_steps):
+    # ugyanazt a dontest irja le, mint az open_relation_scan / open_first_relation
+    table_info = relation["table_info"]
+    conditions = relation["conditions"]
+    details = []
+    access_path = None
+    if key_order_scan and key_order_scan["kind"] == "index":
+        kind = "Index Order Scan"
+        direction = "DESC" if key_order_scan["direction"] == -1 else "ASC"
+        details.append(f"reads {relation['alias']}.{key_order_scan['field_name']} {direction} through its index for ORDER BY")
     else:
-        final_results_for_ordering = final_results_after_where
+        access_path = choose_index_access_path(mongo_db, table_info, conditions)
+        mongo_filter, _ = split_relation_conditions(table_info, conditions)
+        kind = "Primary Key Scan" if "_id" in mongo_filter else "Full Scan"
+        if key_order_scan and key_order_scan["kind"] == "key":
+            details.append("in primary key order for ORDER BY")
+        elif any(step["uses_scan_order"] for step in join_steps):
+            details.append("in primary key order for the merge join")
+    if access_path:
+        kind = "Index Range Scan" if access_path["is_range"] else "Index Scan"
+        details.append(f"index {access_path['index_collection']}: " + " AND ".join(map(format_condition, access_path["conditions"])))
+        if access_path["is_range"]:
+            details.append(f"falls back to a full scan if more than {INDEX_RANGE_MAX_FRACTION:.0%} of the rows match")
+        conditions = [cond for cond in conditions if not any(cond is c for c in access_path["conditions"])]
+    details += describe_filters(table_info, conditions)
+    details.append(describe_columns(relation))
+    details.append(f"estimated rows: {relation['estimated_rows']:.0f} of {relation['row_count']}")
+    return explain_node(("scan", relation["alias"]), relation_label(kind, relation), details)
+
+def explain_join_step(step, outer_node):
+    relation = step["relation"]
+    table_info = relation["table_info"]
+    inner_filter_conditions = relation["conditions"]
+    is_pk = step["inner_field_name"] == table_info["attributes"][0]["name"]
+    if step["algorithm"] == "inlj":
+        label = "Indexed Nested Loop Join"
+        lookup = "primary key" if is_pk else f"index {relation['table']}_{step['inner_field_name']}_index"
+        inner = explain_node(None, relation_label("Index Lookup", relation), [
+            f"{lookup} lookups for every {JOIN_BATCH_SIZE} outer rows",
+        ] + describe_filters(table_info, inner_filter_conditions, python_side=False) + [describe_columns(relation)])
+    else:
+        if step["algorithm"] == "merge":
+            label = "Sort-Merge Join"
+            order = "read in primary key order" if step["inner_sorted"] else "sorted before merging"
+            side = f"outer input {'already sorted' if step['outer_sorted'] else 'sorted before merging'}"
+        else:
+            label = "Hash Join"
+            order = None
+            side = f"build side: {step['build_side']} (Grace partitions above {HASH_JOIN_MEMORY_BUDGET // (1024 * 1024)} MB)"
+        inner = explain_node(None, relation_label("Full Scan", relation), [order] + describe_filters(
+            table_info, inner_filter_conditions, python_side=False
+        ) + [describe_columns(relation), f"estimated rows: {relation['estimated_rows']:.0f} of {relation['row_count']}"])
+    costs = ", ".join(f"{name}={cost:.0f}" for name, cost in step["costs"].items())
+    details = [
+        f"on {step['outer_alias']}.{step['outer_field_name']} = {relation['alias']}.{step['inner_field_name']}",
+        side if step["algorithm"] != "inlj" else None,
+        f"estimated rows: {step['estimated_rows']:.0f}, costs: {costs}",
+    ]
+    return explain_node(("join", relation["alias"]), label, details, [outer_node, inner])
+
+def explain_plan(plan, parsed_statement, session):
+    # a run_select_plan altal felepitett operator fa, a profil kulcsaival
+    mongo_db = session.mongo_db
+    key_order_scan = plan["key_order_scan"]
+    group_by_columns = parsed_statement["group_by_columns"]
+    aggregate_functions = parsed_statement["aggregate_functions"]
+    first_relation, join_steps, python_side_where_conditions = bind_plan(plan, plan["where_conditions"])
+    aggregate_details = [
+        "group by: " + ", ".join(group_by_columns) if group_by_columns else None,
+        "aggregates: " + ", ".join(f"{agg['func']}({agg['field']})" for agg in aggregate_functions) if aggregate_functions else None,
+    ]
+
+    if uses_columnar_plan(session, parsed_statement, first_relation, join_steps, python_side_where_conditions):
+        _, python_side_conditions = split_relation_conditions(first_relation["table_info"], first_relation["conditions"])
+        if plan_columnar_aggregate(parsed_statement, first_relation, python_side_conditions) is not None:
+            scan = explain_first_relation(mongo_db, first_relation, None, [])
+            scan["key"] = None
+            node = explain_node(
+                ("aggregate",), "Columnar Aggregate",
+                aggregate_details + [f"NumPy batches of {COLUMNAR_BATCH_SIZE} rows, scan and filter included"], [scan],
+            )
+            return explain_output(node, parsed_statement, None)
+
+    node = explain_first_relation(mongo_db, first_relation, key_order_scan, join_steps)
+    for step in join_steps:
+        node = explain_join_step(step, node)
+        _, inner_python_conditions = split_relation_conditions(step["relation"]["table_info"], step["relation"]["conditions"])
+        if step["residual_edges"] or inner_python_conditions:
+            residuals = [" = ".join(f"{alias}.{field_name}" for alias, field_name in edge["fields"].items()) for edge in step["residual_edges"]]
+            node = explain_node(
+                ("filter", step["relation"]["alias"]), "Filter",
+                [" AND ".join(residuals + [format_condition(cond) for cond in inner_python_conditions])], [node],
+            )
+    if python_side_where_conditions:
+        node = explain_node(
+            ("filter", None), "Filter",
+            [" AND ".join(map(format_condition, python_side_where_conditions)) + " (unknown alias, matches no rows)"], [node],
+        )
+    if group_by_columns or aggregate_functions:
+        node = explain_node(("aggregate",), "Hash Aggregate", aggregate_details, [node])
+    return explain_output(node, parsed_statement, key_order_scan)
 
-    # ORDER BY rendezes
-    if order_by_columns:
-
-        def get_value_for_sort(
-            row_item,
-            field_spec_to_sort,
-            main_table_info_param,
-            from_table_alias_param,
-        ):
-            if any(
-                field_spec_to_sort == f"{agg['func']}({agg['field']})"
-                for agg in aggregate_functions
-            ):
-                return row_item.get(field_spec_to_sort)
+def explain_output(node, parsed_statement, key_order_scan):
+    # ugyanaz a sorrend, mint az order_and_project_rows-ban
+    order_by_columns = parsed_statement["order_by_columns"]
+    limit, offset = parsed_statement["limit"], parsed_statement["offset"]
+    distinct = parsed_statement["distinct"]
+    columns = "columns: " + ", ".join(parsed_statement["columns"])
+    order_terms = ", ".join(f"{col['field']} {col['direction']}" for col in order_by_columns)
+
+    if order_by_columns and not key_order_scan and limit is not None:
+        node = explain_node(("sort",), "Top-K Sort", [
+            f"keeps the first {offset + limit} rows by {order_terms} in a heap",
+            columns, "DISTINCT on the output rows" if distinct else None,
+        ], [node])
+    else:
+        if order_by_columns and not key_order_scan:
+            node = explain_node(("sort",), "Sort", [
+                f"by {order_terms}", f"external merge sort above {SORT_MEMORY_BUDGET // (1024 * 1024)} MB",
+            ], [node])
+        node = explain_node(("project",), "Project", [
+            columns, f"ORDER BY {order_terms} satisfied by the read order" if key_order_scan else None,
+        ], [node])
+        if distinct:
+            node = explain_node(("distinct",), "Distinct", [
+                f"hash set, spills to partitions above {DISTINCT_MEMORY_BUDGET // (1024 * 1024)} MB",
+            ], [node])
+    if limit is not None or offset:
+        node = explain_node(("limit",), "Limit", [f"limit {limit if limit is not None else 'none'}, offset {offset}"], [node])
+    return node
+
+def format_explain_tree(node, profile=None, depth=0, lines=None):
+    lines = [] if lines is None else lines
+    prefix = "" if depth == 0 else " " * (5 * depth - 3) + "-> "
+    line = prefix + node["label"]
+    if profile is not None:
+        stats = profile.stats.get(node["key"])
+        if node["key"] is None:
+            line += " (included in the parent operator)"
+        elif stats is None:
+            line += " (never executed)"
+        else:
+            child_stats = [profile.stats[child["key"]] for child in node["children"] if child["key"] in profile.stats]
+            rows_in = f"rows in={sum(child['rows'] for child in child_stats)}, " if child_stats else ""
+            line += (
+                f" (actual time={stats['time'] * 1000:.1f} ms, {rows_in}rows out={stats['rows']}, "
+                f"round trips={stats['round_trips']}, peak memory={format_bytes(stats['peak_memory'])})"
+            )
+    lines.append(line)
+    for detail in node["details"]:
+        lines.append(" " * (len(prefix) + 2) + detail)
+    for child in node["children"]:
+        format_explain_tree(child, profile, depth + 1, lines)
+    return "\n".join(lines)
+
+def scan_rows(documents, decode_row):
+    # a decode_row mar a sema sorrendjeben allo tuple-t ad
+    for doc in documents:
+        yield decode_row(doc)
+
+def schema_position(schema, column):
+    try:
+        return schema.index(column)
+    except ValueError:
+        return None
 
-            value = row_item.get(field_spec_to_sort)
-            if value is not None:
-                return value
-
-            if "." not in field_spec_to_sort:
-                for k_in_row in row_item.keys():
-                    if k_in_row.endswith(f".{field_spec_to_sort}"):
-                        return row_item.get(k_in_row)
-
-                if (
-                    field_spec_to_sort
-                    == main_table_info_param["attributes"][0]["name"]
-                ):
-                    return row_item.get(
-                        f"{from_table_alias_param}.{field_spec_to_sort}"
+def row_picker(positions):
+    # a sor megadott poziciokon allo ertekei, tuple-kent
+    if not positions:
+        return lambda row: ()
+    if len(positions) == 1:
+        position = positions[0]
+        return lambda row: (row[position],)
+    return operator.itemgetter(*positions)
+
+def iterate_batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def filter_rows(rows, python_side_where_conditions, schema):
+    if not python_side_where_conditions:
+        yield from rows
+        return
+
+    checks = [
+        (schema_position(schema, f"{cond['field_alias']}.{cond['field_name']}"), cond["op"], cond["value"])
+        for cond in python_side_where_conditions
+    ]
+    for row in rows:
+        all_conditions_met = True
+        for position, op, target_value in checks:
+            current_value = row[position] if position is not None else None
+            if current_value is None: all_conditions_met = False; break
+            try:
+                if isinstance(target_value, int): current_value = int(current_value)
+                elif isinstance(target_value, float): current_value = float(current_value)
+                elif isinstance(target_value, str): current_value = str(current_value)
+            except (ValueError, TypeError): all_conditions_met = False; break
+            
+            if op == "=": is_met = (current_value == target_value)
+            elif op == "<": is_met = (current_value < target_value)
+            elif op == ">": is_met = (current_value > target_value)
+            elif op == "<=": is_met = (current_value <= target_value)
+            elif op == ">=": is_met = (current_value >= target_value)
+            else: is_met = False
+            if not is_met: all_conditions_met = False; break
+        if all_conditions_met:
+            yield row
+
+def compile_projection(columns_to_project, schema):
+    # kimeneti oszlopnevek es a sorbol az ertekeik tuple-je; oszloponkent (pozicio, tartalek
+    # pozicio, ha az elso NULL), egyszer a schema alapjan
+    outputs = []
+    if columns_to_project == ["*"]:
+        for position, name in enumerate(schema):
+            output_key = name
+            if "." in name and not aggregate_pattern.match(name):
+                output_key = name.split(".", 1)[1]
+            outputs.append((output_key, position, None))
+    else:
+        for col_spec_from_query in columns_to_project:
+            is_aggregate_column = aggregate_pattern.match(col_spec_from_query)
+            output_column_name = col_spec_from_query
+            if "." in col_spec_from_query and not is_aggregate_column:
+                output_column_name = col_spec_from_query.split(".", 1)[1]
+
+            fallback_position = None
+            if not is_aggregate_column:
+                if "." in col_spec_from_query:
+                    fallback_position = schema_position(schema, col_spec_from_query.split(".", 1)[1])
+                else:
+                    fallback_position = next(
+                        (
+                            position for position, name in enumerate(schema)
+                            if name.endswith(f".{col_spec_from_query}") and not aggregate_pattern.match(name)
+                        ),
+                        None,
                     )
+            outputs.append((output_column_name, schema_position(schema, col_spec_from_query), fallback_position))
+
+    def project_values(row_data):
+        projected_values = []
+        for _, position, fallback_position in outputs:
+            value_to_project = row_data[position] if position is not None else None
+            if value_to_project is None and fallback_position is not None:
+                value_to_project = row_data[fallback_position]
+            projected_values.append(value_to_project)
+        return tuple(projected_values)
+
+    return [output[0] for output in outputs], project_values
+
+def resolve_row_column(field_spec, schema):
+    # minosites nelkul az elso olyan oszlop, ami .mezo-re vegzodik
+    if "." not in field_spec:
+        for name in schema:
+            if name.endswith(f".{field_spec}"):
+                return schema.index(name)
+    return schema_position(schema, field_spec)
+
+def aggregate_input_value(value):
+    # SUM/AVG/MIN/MAX csak szamokkal dolgozik, a szovegkent tarolt szamokat atalakitjuk
+    if isinstance(value, str):
+        try:
+            return float(value) if "." in value else int(value)
+        except ValueError:
             return None
+    if isinstance(value, (int, float)):
+        return value
+    return None
 
-        def compare_rows(item1, item2):
-            for order_col in order_by_columns:
-                field_spec = order_col["field"]
-                direction = order_col["direction"]
+def new_accumulator(func_name):
+    # COUNT: [darab], SUM/AVG: [osszeg, darab], MIN/MAX: [ertek]
+    if func_name == "COUNT":
+        return [0]
+    if func_name in ("SUM", "AVG"):
+        return [0, 0]
+    return [None]
+
+def accumulator_result(func_name, accumulator):
+    if func_name == "AVG":
+        return accumulator[0] / accumulator[1] if accumulator[1] else None
+    return accumulator[0]
+
+def aggregate_output_schema(group_by_columns, aggregate_functions):
+    # a csoport oszlopok alias nelkul, utana az aggregatumok; az azonos nevek egy oszlopot adnak
+    output_names = [col_spec.split(".", 1)[1] if "." in col_spec else col_spec for col_spec in group_by_columns]
+    aggregate_names = [f"{agg['func']}({agg['field']})" for agg in aggregate_functions]
+    return output_names, list(dict.fromkeys(output_names + aggregate_names))
+
+def hash_aggregate(rows, schema, group_by_columns, aggregate_functions):
+    # a memoria a csoportok szamaval no, nem a sorokeval
+    groups = {}
+    group_positions = [resolve_row_column(col_spec, schema) for col_spec in group_by_columns]
+    # "*" eseten az egesz sor szamit (COUNT(*)), hianyzo oszlopnal minden ertek NULL
+    aggregate_positions = [
+        (agg["func"], agg["field"] == "*", resolve_row_column(agg["field"], schema))
+        for agg in aggregate_functions
+    ]
+    for row in rows:
+        group_key = tuple(row[position] if position is not None else None for position in group_positions)
+        accumulators = groups.get(group_key)
+        if accumulators is None:
+            accumulators = groups[group_key] = [new_accumulator(agg["func"]) for agg in aggregate_functions]
+
+        for (func_name, whole_row, position), accumulator in zip(aggregate_positions, accumulators):
+            value = row if whole_row else row[position] if position is not None else None
+            if value is None:
+                continue
+            if func_name == "COUNT":
+                accumulator[0] += 1
+                continue
+            value = aggregate_input_value(value)
+            if value is None:
+                continue
+            if func_name in ("SUM", "AVG"):
+                accumulator[0] += value
+                accumulator[1] += 1
+            elif func_name == "MIN":
+                if accumulator[0] is None or value < accumulator[0]:
+                    accumulator[0] = value
+            elif accumulator[0] is None or value > accumulator[0]:
+                accumulator[0] = value
+
+    # GROUP BY nelkul ures bemenetre is egy sort adunk
+    if not group_by_columns and not groups:
+        groups[()] = [new_accumulator(agg["func"]) for agg in aggregate_functions]
+
+    output_names, output_schema = aggregate_output_schema(group_by_columns, aggregate_functions)
+    aggregated_rows = []
+    for group_key, accumulators in groups.items():
+        aggregated_row = dict(zip(output_names, group_key))
+        for agg, accumulator in zip(aggregate_functions, accumulators):
+            aggregated_row[f"{agg['func']}({agg['field']})"] = accumulator_result(agg["func"], accumulator)
+        aggregated_rows.append(tuple(aggregated_row.values()))
+    return aggregated_rows, output_schema
+
+def use_columnar_execution(session, relation):
+    if np is None or session.execution_mode == EXECUTION_MODE_ROW:
+        return False
+    if session.execution_mode == EXECUTION_MODE_COLUMNAR:
+        return True
+    return relation["row_count"] >= COLUMNAR_MIN_ROWS
+
+def resolve_relation_attribute(field_spec, relation):
+    if "." in field_spec:
+        field_alias, field_name = field_spec.split(".", 1)
+        if field_alias != relation["alias"]:
+            return None
+    else:
+        field_name = field_spec
+    return next((attr for attr in relation["table_info"]["attributes"] if attr["name"] == field_name), None)
 
-                val1 = get_value_for_sort(
-                    item1, field_spec, main_table_info, from_table_alias
-                )
-                val2 = get_value_for_sort(
-                    item2, field_spec, main_table_info, from_table_alias
-                )
+def plan_columnar_aggregate(parsed_statement, relation, python_side_conditions):
+    # None, ha valamelyik oszlop vagy feltetel csak soronkent ertekelheto ki
+    group_attributes = [resolve_relation_attribute(col_spec, relation) for col_spec in parsed_statement["group_by_columns"]]
+    if any(attr is None for attr in group_attributes):
+        return None
 
-                if val1 is None and val2 is None:
-                    cmp = 0
-                elif val1 is None:
-                    cmp = 1 if direction == "ASC" else -1
-                elif val2 is None:
-                    cmp = -1 if direction == "ASC" else 1
-                else:
-                    try:
-                        if isinstance(val1, (int, float)) and isinstance(
-                            val2, (int, float)
-                        ):
-                            if val1 < val2:
-                                cmp = -1
-                            elif val1 > val2:
-                                cmp = 1
-                            else:
-                                cmp = 0
-                        elif isinstance(val1, str) and isinstance(val2, str):
-                            if val1 < val2:
-                                cmp = -1
-                            elif val1 > val2:
-                                cmp = 1
-                            else:
-                                cmp = 0
-                        else:
-                            s_val1, s_val2 = str(val1), str(val2)
-                            if s_val1 < s_val2:
-                                cmp = -1
-                            elif s_val1 > s_val2:
-                                cmp = 1
-                            else:
-                                cmp = 0
-                    except TypeError:
-                        cmp = 0
-
-                if cmp != 0:
-                    if direction == "DESC":
-                        cmp *= -1
-                    return cmp
-            return 0
-
-        final_results_for_ordering.sort(key=functools.cmp_to_key(compare_rows))
-
-    # PROJECTION
-    output_rows = []
-    for row_data in final_results_for_ordering:
-        projected_row = {}
-        if columns_to_project == ["*"]:
-            for k, v in row_data.items():
-                output_key = k
-                if "." in k and not aggregate_pattern.match(k):
-                    output_key = k.split(".", 1)[1]
-                projected_row[output_key] = v
+    aggregates = []
+    for agg in parsed_statement["aggregate_functions"]:
+        attr = None if agg["field"] == "*" else resolve_relation_attribute(agg["field"], relation)
+        if agg["field"] != "*" and attr is None:
+            return None
+        if agg["func"] != "COUNT" and (attr is None or attr["type"] not in ATTRIBUTE_CONVERTERS):
+            return None
+        aggregates.append((agg["func"], attr))
+
+    attributes_by_name = {attr["name"]: attr for attr in relation["table_info"]["attributes"]}
+    conditions = []
+    for cond in python_side_conditions:
+        attr = attributes_by_name.get(cond["field_name"])
+        value = cond["value"]
+        if attr is None:
+            return None
+        if attr["type"] in ATTRIBUTE_CONVERTERS:
+            if not isinstance(value, (int, float)):
+                return None
+        elif not isinstance(value, str):
+            return None
+        conditions.append((attr, cond["op"], value))
+    return {"group_attributes": group_attributes, "aggregates": aggregates, "conditions": conditions}
+
+def column_array(values, attr_type):
+    # (ertekek, NULL maszk); a NULL-ok helyen semleges ertek all
+    data = np.array(values, dtype=object)
+    nulls = np.equal(data, None)
+    if nulls.any():
+        data[nulls] = 0 if attr_type in ATTRIBUTE_CONVERTERS else ""
+    if attr_type == "int":
+        return data.astype(np.int64), nulls
+    if attr_type == "float":
+        return data.astype(np.float64), nulls
+    return data.astype(str), nulls
+
+def column_condition_mask(data, nulls, attr_type, op, value):
+    # a filter_rows konverziojat koveti: az oszlop erteke a feltetel ertekenek tipusara alakul
+    if isinstance(value, int) and attr_type == "float":
+        data = np.trunc(data)
+    elif isinstance(value, float) and attr_type == "int":
+        data = data.astype(np.float64)
+    compare = {"=": np.equal, "<": np.less, ">": np.greater, "<=": np.less_equal, ">=": np.greater_equal}.get(op)
+    if compare is None:
+        return np.zeros(len(data), dtype=bool)
+    return compare(data, value) & ~nulls
+
+def grow_column(array, size, fill):
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.full(size - len(array), fill, dtype=array.dtype)])
+
+def new_column_accumulator(func_name, attr):
+    # csoportonkent egy-egy tombelem: darab, valamint osszeg vagy min/max ertek
+    dtype = np.int64 if attr is not None and attr["type"] == "int" else np.float64
+    accumulator = {"count": np.zeros(0, dtype=np.int64)}
+    if func_name in ("SUM", "AVG"):
+        accumulator["value"], accumulator["fill"] = np.zeros(0, dtype=dtype), 0
+    elif func_name in ("MIN", "MAX"):
+        if dtype is np.int64:
+            limits = np.iinfo(np.int64)
+            fill = limits.max if func_name == "MIN" else limits.min
         else:
-            for col_spec_from_query in columns_to_project:
-                output_column_name = col_spec_from_query
-                if (
-                    "." in col_spec_from_query
-                    and not aggregate_pattern.match(col_spec_from_query)
-                ):
-                    output_column_name = col_spec_from_query.split(".", 1)[1]
-
-                value_to_project = None
-                is_aggregate_column = False
-                agg_match = aggregate_pattern.match(col_spec_from_query)
-                if agg_match:
-                    is_aggregate_column = True
-                    value_to_project = row_data.get(col_spec_from_query)
-
-                if not is_aggregate_column:
-                    value_to_project = row_data.get(col_spec_from_query)
-
-                    if value_to_project is None and "." in col_spec_from_query:
-                        alias_less_col_spec = col_spec_from_query.split(
-                            ".", 1
-                        )[1]
-                        value_to_project = row_data.get(alias_less_col_spec)
-
-                    if (
-                        value_to_project is None
-                        and "." not in col_spec_from_query
-                    ):
-                        for key_in_row_data in row_data.keys():
-                            if key_in_row_data.endswith(
-                                f".{col_spec_from_query}"
-                            ) and not aggregate_pattern.match(
-                                key_in_row_data
-                            ):
-                                value_to_project = row_data.get(
-                                    key_in_row_data
-                                )
-                                break
-
-                projected_row[output_column_name] = value_to_project
-        output_rows.append(projected_row)
+            fill = np.inf if func_name == "MIN" else -np.inf
+        accumulator["value"], accumulator["fill"] = np.zeros(0, dtype=dtype), fill
+    return accumulator
+
+def update_column_accumulator(accumulator, func_name, group_index, values, nulls, group_count):
+    if values is not None:
+        valid = ~nulls
+        group_index, values = group_index[valid], values[valid]
+    accumulator["count"] = grow_column(accumulator["count"], group_count, 0)
+    accumulator["count"] += np.bincount(group_index, minlength=group_count)
+    if func_name == "COUNT":
+        return
+    accumulator["value"] = grow_column(accumulator["value"], group_count, accumulator["fill"])
+    # az ufunc.at sorrendben adja hozza az ertekeket, igy az osszeg ugyanaz, mint soronkent
+    if func_name in ("SUM", "AVG"):
+        np.add.at(accumulator["value"], group_index, values)
+    elif func_name == "MIN":
+        np.minimum.at(accumulator["value"], group_index, values)
+    else:
+        np.maximum.at(accumulator["value"], group_index, values)
+
+def column_accumulator_result(accumulator, func_name, group_id):
+    count = int(accumulator["count"][group_id]) if group_id < len(accumulator["count"]) else 0
+    if func_name == "COUNT":
+        return count
+    if not count:
+        return 0 if func_name == "SUM" else None
+    value = accumulator["value"][group_id].item()
+    return value / count if func_name == "AVG" else value
+
+def columnar_aggregate(mongo_db, relation, parsed_statement):
+    # a hash_aggregate oszlopos valtozata; None eseten a lekerdezes soronkent fut
+    documents, python_side_conditions = open_relation_scan(mongo_db, relation)
+    plan = plan_columnar_aggregate(parsed_statement, relation, python_side_conditions)
+    if plan is None:
+        print("OPTIMIZER: Query is not eligible for columnar execution. Using row mode.")
+        return None
+    print(f"OPTIMIZER: Using columnar execution on {relation['table']} (batches of {COLUMNAR_BATCH_SIZE} rows).")
+    try:
+        column_names = decoded_column_names(relation["table_info"], relation["columns"])
+        return run_columnar_aggregate(documents, relation["decode_row"], column_names, plan, parsed_statement)
+    except (TypeError, ValueError, OverflowError) as e:
+        print(f"OPTIMIZER: Columnar execution failed ({e}). Using row mode.")
+        return None
 
-    seen = set()
-    unique_output = []
-    for item in output_rows:
-        h = json.dumps(item, sort_keys=True)
-        if h not in seen:
-            seen.add(h)
-            unique_output.append(item)
+def run_columnar_aggregate(documents, decode_row, column_names, plan, parsed_statement):
+    group_attributes, aggregates = plan["group_attributes"], plan["aggregates"]
+    column_positions = {name: position for position, name in enumerate(column_names)}
+    group_positions = [column_positions[attr["name"]] for attr in group_attributes]
+    group_ids = {}
+    group_keys = []
+    accumulators = [new_column_accumulator(func_name, attr) for func_name, attr in aggregates]
+    if not group_attributes:
+        # GROUP BY nelkul ures bemenetre is egy sort adunk
+        group_ids[()] = 0
+        group_keys.append(())
+
+    for batch in iterate_batches(documents, COLUMNAR_BATCH_SIZE):
+        rows = [decode_row(doc) for doc in batch]
+        arrays = {}
+
+        def column(attr):
+            name = attr["name"]
+            if name not in arrays:
+                position = column_positions[name]
+                arrays[name] = column_array([row[position] for row in rows], attr["type"])
+            return arrays[name]
+
+        selected = None
+        for attr, op, value in plan["conditions"]:
+            data, nulls = column(attr)
+            mask = column_condition_mask(data, nulls, attr["type"], op, value)
+            selected = mask if selected is None else selected & mask
+        if selected is not None:
+            selected = np.nonzero(selected)[0]
+            if not len(selected):
+                continue
 
-    return json.dumps(unique_output, indent=2, separators=(",", ":"))
+        def selected_column(attr):
+            data, nulls = column(attr)
+            if selected is None:
+                return data, nulls
+            return data[selected], nulls[selected]
+
+        row_count = len(rows) if selected is None else len(selected)
+        if group_attributes:
+            codes = []
+            for attr in group_attributes:
+                data, nulls = selected_column(attr)
+                _, inverse = np.unique(data, return_inverse=True)
+                codes.append(inverse.reshape(-1) * 2 + nulls)
+            if len(codes) == 1:
+                _, first_rows, inverse = np.unique(codes[0], return_index=True, return_inverse=True)
+            else:
+                _, first_rows, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_index=True, return_inverse=True)
+
+            # a csoportok sorszama az elso elofordulas sorrendjet koveti, mint soronkent
+            batch_group_ids = np.empty(len(first_rows), dtype=np.intp)
+            for local_id in np.argsort(first_rows, kind="stable"):
+                row_index = first_rows[local_id] if selected is None else selected[first_rows[local_id]]
+                group_key = tuple(rows[row_index][position] for position in group_positions)
+                group_id = group_ids.get(group_key)
+                if group_id is None:
+                    group_id = group_ids[group_key] = len(group_keys)
+                    group_keys.append(group_key)
+                batch_group_ids[local_id] = group_id
+            group_index = batch_group_ids[inverse.reshape(-1)]
+        else:
+            group_index = np.zeros(row_count, dtype=np.intp)
+
+        for accumulator, (func_name, attr) in zip(accumulators, aggregates):
+            values, nulls = selected_column(attr) if attr is not None else (None, None)
+            update_column_accumulator(accumulator, func_name, group_index, values, nulls, len(group_keys))
+
+    output_names, output_schema = aggregate_output_schema(
+        parsed_statement["group_by_columns"], parsed_statement["aggregate_functions"]
+    )
+    aggregated_rows = []
+    for group_id, group_key in enumerate(group_keys):
+        aggregated_row = dict(zip(output_names, group_key))
+        for agg, accumulator in zip(parsed_statement["aggregate_functions"], accumulators):
+            aggregated_row[f"{agg['func']}({agg['field']})"] = column_accumulator_result(accumulator, agg["func"], group_id)
+        aggregated_rows.append(tuple(aggregated_row.values()))
+    return aggregated_rows, output_schema
+
+def distinct_rows(rows, memory_budget=None):
+    # a sorok hash-elheto ertek tuple-ok, mindegyik az elso elofordulasa helyen jon.
+    # A memoriakeret felett az uj sorok a sorszamukkal particiokba kerulnek; a particiok
+    # kulon deduplikalodnak, es sorszam szerint osszefesulve az eredeti sorrendben jonnek
+    memory_budget = memory_budget or DISTINCT_MEMORY_BUDGET
+    seen = set()
+    sampled_size = 0
+    partitions = None
+    sorted_runs = SortedRuns(join_key_of)
+    try:
+        for seq, row in enumerate(rows):
+            if row in seen:
+                continue
+            if partitions is not None:
+                partitions.add(row, seq)
+                continue
+            seen.add(row)
+            if len(seen) <= ROW_SIZE_SAMPLE:
+                sampled_size += estimate_row_size(row)
+            yield row
+            if sampled_size / min(len(seen), ROW_SIZE_SAMPLE) * len(seen) > memory_budget:
+                partitions = SpillPartitions(DISTINCT_PARTITIONS, 0)
+
+        if partitions is None:
+            return
+        print(f"ALGORITHM: DISTINCT spilled to {DISTINCT_PARTITIONS} partitions on disk")
+        for partition in range(DISTINCT_PARTITIONS):
+            first_seq = {}
+            for row, seq in partitions.read(partition):
+                first_seq.setdefault(row, seq)
+            sorted_runs.add(sorted((seq, row) for row, seq in first_seq.items()))
+        for _, row in sorted_runs.merge():
+            yield row
+    finally:
+        if partitions is not None:
+            partitions.close()
+        sorted_runs.close()
+
+def stream_json_array(rows, batch_size=None):
+    # a kimenetet darabokban kuldjuk, a szoveg ugyanaz, mint json.dumps(rows, indent=2) eseten
+    batch_size = batch_size or RESULT_BATCH_SIZE
+    first_batch = True
+    for batch in iterate_batches(rows, batch_size):
+        body = json.dumps(batch, indent=2, separators=(",", ":"))[2:-2]
+        yield ("[\n" if first_batch else ",\n") + body
+        first_batch = False
+    yield "[]" if first_batch else "\n]"
 
 def parse_select_statement(tokens):
     parsed = {
@@ -1191,9 +3350,30 @@ def parse_select_statement(tokens):
         "where_conditions": [],
         "group_by_columns": [],
         "order_by_columns": [],
+        "limit": None,
+        "offset": 0,
+        "distinct": False,
     }
 
+    # LIMIT/OFFSET a lekerdezes vegen all, a tobbi zaradekot nelkule parseoljuk
+    for i, token in enumerate(tokens):
+        if token.upper() in ("LIMIT", "OFFSET"):
+            limit_tokens = [t.upper() for t in tokens[i:]]
+            tokens = tokens[:i]
+            seen_keywords = set()
+            for j in range(0, len(limit_tokens), 2):
+                keyword = limit_tokens[j]
+                if keyword not in ("LIMIT", "OFFSET") or keyword in seen_keywords \
+                        or j + 1 >= len(limit_tokens) or not limit_tokens[j + 1].isdigit():
+                    return {"error": "Syntax error in LIMIT/OFFSET clause. Usage: LIMIT <count> [OFFSET <count>]"}
+                seen_keywords.add(keyword)
+                parsed[keyword.lower()] = int(limit_tokens[j + 1])
+            break
+
     select_index = 1
+    if len(tokens) > 1 and tokens[1].upper() == "DISTINCT":
+        parsed["distinct"] = True
+        select_index = 2
     from_index = -1
     group_by_index = -1
     order_by_index = -1
@@ -1387,7 +3567,55 @@ def parse_select_statement(tokens):
 
     return parsed
 
-def insert_bulk_into_table(tokens):
+def prepare_statement(tokens, session):
+    if len(tokens) < 4 or tokens[2].upper() != "AS" or tokens[3].upper() != "SELECT":
+        return "Syntax error in PREPARE. Usage: PREPARE <name> AS SELECT ... WHERE <field> = ?"
+    parsed_statement = parse_select_statement(tokens[3:])
+    if "error" in parsed_statement: return parsed_statement["error"]
+
+    # parameter csak a WHERE feltetelek jobb oldalan allhat
+    parameter_positions = []
+    for i, cond_str in enumerate(parsed_statement["where_conditions"]):
+        match = condition_pattern.match(cond_str)
+        if match and match.group(3).strip() == PARAMETER_PLACEHOLDER:
+            parameter_positions.append(i)
+
+    session.prepared_statements[tokens[1]] = {
+        "text": " ".join(tokens[3:]),
+        "parsed_statement": parsed_statement,
+        "parameter_positions": parameter_positions,
+    }
+    return f"Statement prepared: {tokens[1]} ({len(parameter_positions)} parameter(s))"
+
+def execute_prepared_statement(tokens, session):
+    if len(tokens) < 2:
+        return "Syntax error in EXECUTE. Usage: EXECUTE <name> [(<value>, ...)]"
+    prepared = session.prepared_statements.get(tokens[1])
+    if prepared is None:
+        return f"Error: Prepared statement '{tokens[1]}' does not exist."
+
+    args_str = " ".join(tokens[2:]).strip()
+    if args_str and not (args_str.startswith("(") and args_str.endswith(")")):
+        return "Syntax error in EXECUTE. Usage: EXECUTE <name> [(<value>, ...)]"
+    args = re.findall(r'"[^"]*"|\'[^\']*\'|[^,\s]+', args_str[1:-1])
+    parameter_positions = prepared["parameter_positions"]
+    if len(args) != len(parameter_positions):
+        return f"Error: Expected {len(parameter_positions)} parameter(s), got {len(args)}"
+
+    # a ? helyere a literal kerul, igy ugyanugy ertelmezzuk, mint egy kozvetlen SELECT-ben
+    template = prepared["parsed_statement"]
+    where_conditions = list(template["where_conditions"])
+    for position, arg in zip(parameter_positions, args):
+        where_conditions[position] = where_conditions[position][:-len(PARAMETER_PLACEHOLDER)] + arg
+    parsed_statement = dict(template, where_conditions=where_conditions)
+
+    # az ertek tipusa befolyasolja a pushdownt es az index hasznalatot, ezert a terv kulcs resze
+    arg_types = tuple(type(parse_literal(arg)).__name__ for arg in args)
+    plan_key = (session.current_db, prepared["text"], arg_types)
+    cache_key = (session.current_db, prepared["text"], tuple(args))
+    return cached_select(session, cache_key, parsed_statement, plan_key)
+
+def insert_bulk_into_table(tokens, session):
     if (
         len(tokens) < 4
         or tokens[2].upper() != "INTO"
@@ -1409,7 +3637,7 @@ def insert_bulk_into_table(tokens):
 
     try:
         inserted_count = parse_and_insert_documents(
-            table_name, documents_to_insert, skip_index_update=True
+            table_name, documents_to_insert, session
         )
         return f"Inserted {inserted_count} records into {table_name}"
     except ValueError as ve:
@@ -1417,18 +3645,18 @@ def insert_bulk_into_table(tokens):
     except Exception as e:
         return f"Unexpected error: {str(e)}"
     
-def parse_and_insert_documents(table_name, records_values_list, skip_index_update=False):
+def parse_and_insert_documents(table_name, records_values_list, session):
+    mongo_db = session.mongo_db
     if mongo_db is None:
         raise ValueError("Error: No database selected")
     
-    catalog = load_catalog()
-    db = get_current_database(catalog)
-    table = next((t for t in db["tables"] if t["name"] == table_name), None)
+    db = get_current_database(session)
+    table = catalog.get_table(db["name"], table_name)
     if not table:
         raise ValueError(f"Table '{table_name}' does not exist in the current database.")
     
     attributes = table["attributes"]
-    documents_for_mongo = []
+    rows_to_insert = []
 
     for values_raw in records_values_list:
         if len(values_raw) != len(attributes):
@@ -1450,74 +3678,144 @@ def parse_and_insert_documents(table_name, records_values_list, skip_index_updat
                 raise ValueError(f"Type mismatch for '{attr['name']}': expected {typ}, got '{val_str}'")
             converted_values.append(val)
 
-        _id_value = str(converted_values[0])
-        value_string = "#".join(str(v) for v in converted_values[1:])
-        documents_for_mongo.append({"_id": _id_value, "value": value_string})
+        rows_to_insert.append(converted_values)
 
-    if not documents_for_mongo:
+    if not rows_to_insert:
         return 0
 
-    try:
-        collection = mongo_db[table_name]
-        collection.insert_many(documents_for_mongo, ordered=False)
-
-        if skip_index_update:
-            return len(documents_for_mongo)
+    check_insert_constraints(mongo_db, db["name"], table, rows_to_insert)
 
-        return len(documents_for_mongo)
+    collection = mongo_db[table_name]
+    inserted_rows = rows_to_insert
+    errors = []
+    try:
+        try:
+            # ordered=True: hiba eseten pontosan az elso nInserted sor kerult be
+            collection.insert_many([build_document(table, values) for values in rows_to_insert], ordered=True)
+        except pymongo.errors.BulkWriteError as bwe:
+            inserted_count = bwe.details.get("nInserted", 0)
+            inserted_rows = rows_to_insert[:inserted_count]
+            errors.append(f"Bulk write error after {inserted_count} inserted record(s): {bwe.details}")
+
+        # a beirt sorokat (reszleges hibanal is) az indexekbe is felvesszuk, kulonben elmaradnak a tablatol
+        failed_indexes = update_indexes_for_new_rows(mongo_db, table, inserted_rows)
+        if failed_indexes:
+            errors.append(f"Index maintenance failed for {', '.join(failed_indexes)}; run REPAIR INDEXES")
+    except Exception as e:
+        errors.append(f"Unexpected error during bulk insert: {str(e)}")
+    finally:
+        # reszleges beszuras utan is elavulhatott a cache
+        result_cache.invalidate(db["name"], table_name)
 
-    except pymongo.errors.BulkWriteError as bwe:
-        error_msg = f"Bulk write error: {bwe.details}"
+    if errors:
+        error_msg = "; ".join(errors)
         print(error_msg)
         raise ValueError(error_msg)
+    return len(rows_to_insert)
+
+def send_result(conn, result, protocol=PROTOCOL_TEXT):
+    if protocol == PROTOCOL_FRAMED:
+        send_framed_result(conn, result)
+        return
+
+    if isinstance(result, str):
+        conn.sendall((result + "\n<<END>>\n").encode())
+        return
+
+    # a SELECT generatorkent adja vissza az eredmenyt, darabonkent kuldjuk el
+    try:
+        for chunk in result:
+            conn.sendall(chunk.encode())
+    except (ConnectionError, OSError):
+        raise
     except Exception as e:
-        error_msg = f"Unexpected error during bulk insert: {str(e)}"
-        print(error_msg)
-        raise ValueError(error_msg)
+        print(f"Error during command processing: {e}")
+        conn.sendall(f"\nError: {e}".encode())
+    conn.sendall("\n<<END>>\n".encode())
 
-# Socket szerver
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.bind((HOST, PORT))
-    s.listen()
-    print(f"The server started at {HOST}:{PORT} address...")
-    while True:
-        conn, addr = s.accept()
-        with conn:
-            print(f"Connected: {addr}")
-            buffer = ""
-            while True:
-                try:
-                    data = conn.recv(4096).decode()
-                except ConnectionResetError:
-                    print(f"Client {addr} forcefully disconnected.")
-                    break
-                except Exception as e:
-                    print(f"Error receiving data: {e}")
-                    break
+def send_framed_result(conn, result):
+    if isinstance(result, str):
+        status = FRAME_ERROR if result.startswith("Error") else FRAME_OK
+        send_frame(conn, status, result.encode())
+        return
 
-                if not data:
-                    print(f"Client {addr} disconnected.")
-                    break
+    # minden darab kulon FRAME_MORE keret, a zaro keret ures
+    try:
+        for chunk in result:
+            send_frame(conn, FRAME_MORE, chunk.encode())
+    except (ConnectionError, OSError):
+        raise
+    except Exception as e:
+        print(f"Error during command processing: {e}")
+        send_frame(conn, FRAME_ERROR, f"Error: {e}".encode())
+        return
+    send_frame(conn, FRAME_OK)
+
+def read_command(reader, session):
+    if session.protocol == PROTOCOL_FRAMED:
+        frame = reader.read_frame()
+        if frame is None:
+            return None
+        return frame[1].decode()
 
-                buffer += data
+    line = reader.read_until(b"\n")
+    if line is None:
+        return None
+    return line.decode()
+
+def handle_client(conn, addr):
+    session = Session(addr)
+    reader = SocketReader(conn)
+    with conn:
+        print(f"Connected: {addr}")
+        while True:
+            try:
+                command = read_command(reader, session)
+            except ConnectionResetError:
+                print(f"Client {addr} forcefully disconnected.")
+                break
+            except Exception as e:
+                print(f"Error receiving data: {e}")
+                break
 
-                while "\n" in buffer:
-                    command, buffer = buffer.split("\n", 1)
-                    command = command.strip()
+            if command is None:
+                print(f"Client {addr} disconnected.")
+                break
 
-                    if not command:
-                        continue
+            command = command.strip()
+            protocol = session.protocol
+            # keretezett modban az ures parancsra is valaszolni kell
+            if not command and protocol == PROTOCOL_TEXT:
+                continue
+
+            print(f"Command ({addr}): {command}")
+            try:
+                result = process_command(command, session)
+            except Exception as e:
+                print(f"Error during command processing: {e}")
+                result = f"Error: {e}"
 
-                    print(f"Command: {command}")
-                    try:
-                        result = process_command(command)
-                    except Exception as e:
-                        print(f"Error during command processing: {e}")
-                        result = f"Error: {e}"
-
-                    try:
-                        conn.sendall((result + "\n<<END>>\n").encode())
-                    except Exception as e:
-                        print(f"Error sending response back to the client {addr}: {e}")
-                        break
-            print(f"Connection closed: {addr}")
+            try:
+                send_result(conn, result, protocol)
+            except Exception as e:
+                print(f"Error sending response back to the client {addr}: {e}")
+                break
+    print(f"Connection closed: {addr}")
+
+
+# Socket szerver
+def start_server():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((HOST, PORT))
+        s.listen()
+        print(f"The server started at {HOST}:{PORT} address...")
+        while True:
+            conn, addr = s.accept()
+            # kapcsolatonkent egy daemon szal: egy tetlen kliens nem foglal le workert
+            # masok elol, es a leallitast sem tartja fel
+            threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+
+
+if __name__ == "__main__":
+    start_server()